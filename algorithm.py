@@ -1,14 +1,27 @@
-import pytesseract
-import easyocr
 import cv2
 import numpy as np
-from PIL import Image, UnidentifiedImageError, ImageOps
+from PIL import Image, UnidentifiedImageError
 import re
 import os
+import io
+import functools
+import mmap
 import logging
-from typing import Dict, List, Optional, Union, Tuple
+import threading
+import time
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union, Tuple
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
+from result_cache import content_key, create_result_cache
+from receipt_geometry import plan_geometry, apply_geometry
+from receipt_quality import ImageQuality, ThresholdVariant, VARIANTS, measure_quality, rank_variants
+from metrics import record_stage, ENGINE_FAILURES, IMAGE_BYTES, IMAGE_PIXELS, OCR_PASSES, OCR_VARIANTS
+from receipt_documents import document_kind, html_lines, pdf_pages, text_lines, check_image_pixels, IMAGE, PDF, HTML
+from tesseract_engine import TesseractEngine, create_tesseract_engine
+from receipt_layout import OCRLine, OCRWord, ReceiptLayout, build_layout, layout_from_lines, order_lines
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,8 +31,438 @@ def round_decimal(value: Decimal) -> Decimal:
     """Round decimal to 2 places using ROUND_HALF_UP."""
     return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-# Set Tesseract path for Windows
-pytesseract.pytesseract.tesseract_cmd = os.getenv('TESSERACT_CMD', '/app/.apt/usr/bin/tesseract')
+# Process-wide EasyOCR readers, keyed by language list and reader options.
+# Building a Reader loads the detection and recognition models, so each
+# worker process should do it at most once per configuration.
+_easyocr_readers: Dict[Tuple, "easyocr.Reader"] = {}
+_easyocr_lock = threading.Lock()
+_easyocr_stats = {'hits': 0, 'misses': 0, 'loads': 0, 'load_seconds': 0.0}
+
+def _reader_key(languages: Tuple[str, ...], options: Dict) -> Tuple:
+    return (tuple(languages), tuple(sorted(options.items())))
+
+def get_easyocr_reader(languages: Tuple[str, ...] = ('en',), **options) -> "easyocr.Reader":
+    """Return the shared EasyOCR reader for these languages/options, loading it once."""
+    key = _reader_key(languages, options)
+    reader = _easyocr_readers.get(key)
+    if reader is not None:
+        with _easyocr_lock:
+            _easyocr_stats['hits'] += 1
+        return reader
+
+    with _easyocr_lock:
+        # Another thread may have finished loading while we waited for the lock
+        reader = _easyocr_readers.get(key)
+        if reader is not None:
+            _easyocr_stats['hits'] += 1
+            return reader
+
+        _easyocr_stats['misses'] += 1
+        start = time.perf_counter()
+        # Imported on first use: easyocr pulls in torch, torchvision, scipy and scikit-image
+        import easyocr
+        reader = easyocr.Reader(list(languages), **options)
+        elapsed = time.perf_counter() - start
+
+        _easyocr_readers[key] = reader
+        _easyocr_stats['loads'] += 1
+        _easyocr_stats['load_seconds'] += elapsed
+        record_stage('easyocr_model_load', elapsed)
+        logger.info(f"Loaded EasyOCR reader {key} in {elapsed:.2f}s")
+        return reader
+
+def get_reader_stats() -> Dict:
+    """Snapshot of EasyOCR reader cache counters."""
+    with _easyocr_lock:
+        stats = dict(_easyocr_stats)
+    stats['cached_readers'] = len(_easyocr_readers)
+    return stats
+
+# Tesseract backend shared by every parser in the process
+_tesseract_engine: Optional[TesseractEngine] = None
+_tesseract_lock = threading.Lock()
+
+def get_tesseract_engine() -> TesseractEngine:
+    """The process-wide Tesseract backend selected by TESSERACT_BACKEND."""
+    global _tesseract_engine
+    with _tesseract_lock:
+        if _tesseract_engine is None:
+            _tesseract_engine = create_tesseract_engine()
+            logger.info(f"Using {_tesseract_engine.name} Tesseract backend")
+        return _tesseract_engine
+
+def get_tesseract_stats() -> Dict:
+    """Call counters of the Tesseract backend, empty until it has been created."""
+    engine = _tesseract_engine
+    if engine is None:
+        return {}
+    return engine.stats()
+
+def warm_up_ocr(languages: Tuple[str, ...] = ('en',), **options) -> None:
+    """Load OCR models ahead of the first request (called from gunicorn hooks)."""
+    try:
+        get_easyocr_reader(languages, **options)
+    except Exception as e:
+        # A failed warm-up should not stop the worker; the first request retries
+        logger.error(f"EasyOCR warm-up failed: {str(e)}")
+    try:
+        get_tesseract_engine().warm_up()
+    except Exception as e:
+        logger.error(f"Tesseract warm-up failed: {str(e)}")
+
+# EasyOCR's recognizer runs one text box at a time on CPU, and the per-call
+# torch overhead dominates for short receipt lines. The batcher gathers the
+# boxes detected in every receipt being processed within a short window
+# and recognises them in one call. A window of 0 turns batching off.
+EASYOCR_BATCH_WINDOW = float(os.getenv('EASYOCR_BATCH_WINDOW_MS', 10)) / 1000
+EASYOCR_MAX_BATCH = int(os.getenv('EASYOCR_MAX_BATCH', 96))
+
+class RecognitionBatcher:
+    """Recognises text boxes from concurrent callers in shared EasyOCR batches.
+
+    Callers run detection themselves and hand over their boxes; a
+    background thread waits up to ``window`` seconds for more callers (or
+    until ``max_batch`` boxes are queued), runs the recognizer once over
+    all crops and gives each caller back its own results.
+    """
+
+    def __init__(self, reader: "easyocr.Reader", window: float, max_batch: int):
+        # Imported here so a change in EasyOCR's internals only disables batching
+        from easyocr import easyocr as easyocr_module
+        from easyocr.utils import get_image_list
+        from easyocr.recognition import get_text
+        self._get_image_list = get_image_list
+        self._get_text = get_text
+        # Recognizer input height; a module global in EasyOCR (64 unless a custom model sets it)
+        self.model_height = easyocr_module.imgH
+        self.reader = reader
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Tuple]" = queue.Queue()
+        self._stats = {'batches': 0, 'requests': 0, 'boxes': 0}
+        self._stats_lock = threading.Lock()
+        threading.Thread(target=self._loop, name='easyocr-batcher', daemon=True).start()
+
+    def recognize(self, image: np.ndarray, horizontal_list: List, free_list: List) -> List[Tuple]:
+        """(box, text, confidence) for each detected box, like Reader.readtext."""
+        if not horizontal_list and not free_list:
+            return []
+        future: Future = Future()
+        self._queue.put((image, horizontal_list, free_list, future))
+        return future.result()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            boxes = len(batch[0][1]) + len(batch[0][2])
+            deadline = time.monotonic() + self.window
+            while boxes < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                boxes += len(request[1]) + len(request[2])
+            try:
+                self._run(batch)
+            except Exception as e:
+                # Never let one bad batch stop the thread; fail its callers instead
+                logger.error(f"EasyOCR batch failed: {str(e)}")
+                for request in batch:
+                    if not request[3].done():
+                        request[3].set_exception(e)
+
+    def _run(self, batch: List[Tuple]) -> None:
+        reader = self.reader
+        model_height = self.model_height
+        image_list, counts, max_width = [], [], 0
+        for image, horizontal_list, free_list, future in batch:
+            crops, width = self._get_image_list(horizontal_list, free_list, image, model_height=model_height)
+            image_list.extend(crops)
+            counts.append(len(crops))
+            max_width = max(max_width, width)
+
+        results = self._get_text(
+            reader.character, model_height, int(max_width), reader.recognizer, reader.converter,
+            image_list, ignore_char=''.join(set(reader.character) - set(reader.lang_char)),
+            batch_size=len(image_list), workers=0, device=reader.device
+        )
+
+        start = 0
+        for request, count in zip(batch, counts):
+            request[3].set_result([tuple(result) for result in results[start:start + count]])
+            start += count
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['requests'] += len(batch)
+            self._stats['boxes'] += len(image_list)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mean_batch_boxes'] = round(stats['boxes'] / stats['batches'], 1) if stats['batches'] else 0.0
+        return stats
+
+_recognition_batcher: Optional[RecognitionBatcher] = None
+_recognition_batcher_lock = threading.Lock()
+_recognition_batching_failed = False
+
+def get_recognition_batcher() -> Optional[RecognitionBatcher]:
+    """The process-wide batcher for the default reader, or None when batching is off."""
+    global _recognition_batcher, _recognition_batching_failed
+    if EASYOCR_BATCH_WINDOW <= 0 or _recognition_batching_failed:
+        return None
+    with _recognition_batcher_lock:
+        if _recognition_batcher is None:
+            try:
+                _recognition_batcher = RecognitionBatcher(
+                    get_easyocr_reader(('en',)), EASYOCR_BATCH_WINDOW, EASYOCR_MAX_BATCH
+                )
+            except (ImportError, AttributeError) as e:
+                logger.error(f"EasyOCR batching unavailable, using readtext: {str(e)}")
+                _recognition_batching_failed = True
+        return _recognition_batcher
+
+def get_batcher_stats() -> Dict:
+    """Recognition batch counters, empty until the batcher has started."""
+    batcher = _recognition_batcher
+    return batcher.stats() if batcher is not None else {}
+
+# Anything parse_receipt_image accepts: a path, raw encoded bytes, or a
+# binary file-like object positioned at the start of the image
+ImageSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+def image_buffer(source: ImageSource) -> Union[bytes, memoryview, mmap.mmap]:
+    """Return the encoded image bytes behind a source without copying where possible.
+
+    Byte buffers are wrapped as-is, files on disk are memory-mapped and
+    in-memory streams expose their underlying buffer.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return memoryview(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return image_buffer(f)
+    if isinstance(source, io.BytesIO):
+        return source.getbuffer()
+    try:
+        # The mapping stays valid after the file object is closed
+        return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return source.read()
+
+@contextmanager
+def open_image_buffer(source: ImageSource) -> Iterator[Union[bytes, memoryview, mmap.mmap]]:
+    """image_buffer that unmaps the file it memory-mapped when the block ends.
+
+    Views of the buffer must not outlive the block.
+    """
+    buffer = image_buffer(source)
+    try:
+        yield buffer
+    finally:
+        if isinstance(buffer, mmap.mmap):
+            try:
+                buffer.close()
+            except BufferError:
+                # An exception's traceback still holds views into the
+                # mapping; it is unmapped when they are freed, and the
+                # original error must not be replaced by this one
+                pass
+
+def decode_grayscale(buffer: Union[bytes, memoryview, mmap.mmap]) -> np.ndarray:
+    """Decode encoded image bytes straight to an 8-bit grayscale array.
+
+    Images whose header declares more than MAX_IMAGE_PIXELS, or whose
+    size can't be read from their header, are rejected before any pixels
+    are decoded.
+    """
+    check_image_pixels(buffer)
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    image = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        # OpenCV has no GIF decoder; Pillow reads it from the same buffer
+        try:
+            with Image.open(io.BytesIO(buffer)) as img:
+                image = np.array(img.convert('L'))
+        except UnidentifiedImageError:
+            raise ValueError("Could not decode the uploaded image")
+    return image
+
+@contextmanager
+def stage_timer(timings: Optional[Dict[str, float]], stage: str):
+    """Add the time spent in the block to ``timings[stage]`` when timings is given.
+
+    Every stage is also recorded in the metrics histograms and the current
+    request's Server-Timing trace.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+        record_stage(stage, elapsed)
+
+def autocontrast_lut(gray: np.ndarray, cutoff: float = 1) -> np.ndarray:
+    """Lookup table matching PIL's ImageOps.autocontrast(cutoff=...) for this image.
+
+    ``cutoff`` percent of pixels is ignored at each end of the histogram
+    and the remaining range is stretched to 0..255.
+    """
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    cut = int(gray.size * cutoff // 100)
+    lo = int(np.searchsorted(np.cumsum(hist), cut, side='right'))
+    hi = 255 - int(np.searchsorted(np.cumsum(hist[::-1]), cut, side='right'))
+    if hi <= lo:
+        return np.arange(256, dtype=np.uint8)
+    scale = 255.0 / (hi - lo)
+    return np.clip(np.arange(256) * scale - lo * scale, 0, 255).astype(np.uint8)
+
+
+# Bump when preprocessing or parsing changes in a way that alters results,
+# so cached results from the old code are not served
+PARSER_VERSION = '4'
+
+@dataclass
+class PreprocessConfig:
+    """Geometry normalisation and binarization applied before OCR.
+
+    Cropping to the paper, deskewing and resampling so text is about
+    ``target_text_height`` pixels tall (0 disables resampling) cut the
+    pixel count the OCR engines have to process on large phone photos.
+
+    Images taller than ``tile_height`` are OCR'd in horizontal bands that
+    overlap by ``tile_overlap`` pixels; ``max_long_edge`` then only caps
+    the width, so long receipts keep legible text. 0 disables tiling.
+
+    With ``adaptive`` on, up to ``max_variants`` threshold settings ranked
+    by the image's quality are OCR'd in turn, stopping at the first whose
+    lines reach ``accept_confidence`` with ``accept_price_lines`` prices.
+    """
+    crop_receipt: bool = True
+    deskew: bool = True
+    target_text_height: int = 28
+    max_upscale: float = 2.0
+    max_long_edge: int = 3000
+    tile_height: int = 2000
+    tile_overlap: int = 128
+    adaptive: bool = True
+    max_variants: int = 2
+    accept_confidence: float = 0.75
+    accept_price_lines: int = 3
+
+    @classmethod
+    def from_env(cls) -> "PreprocessConfig":
+        return cls(
+            crop_receipt=os.getenv('OCR_CROP_RECEIPT', '1') == '1',
+            deskew=os.getenv('OCR_DESKEW', '1') == '1',
+            target_text_height=int(os.getenv('OCR_TEXT_HEIGHT', 28)),
+            max_upscale=float(os.getenv('OCR_MAX_UPSCALE', 2.0)),
+            max_long_edge=int(os.getenv('OCR_MAX_LONG_EDGE', 3000)),
+            tile_height=int(os.getenv('OCR_TILE_HEIGHT', 2000)),
+            tile_overlap=int(os.getenv('OCR_TILE_OVERLAP', 128)),
+            adaptive=os.getenv('OCR_ADAPTIVE', '1') == '1',
+            max_variants=int(os.getenv('OCR_MAX_VARIANTS', 2)),
+            accept_confidence=float(os.getenv('OCR_ACCEPT_CONFIDENCE', 0.75)),
+            accept_price_lines=int(os.getenv('OCR_ACCEPT_PRICE_LINES', 3))
+        )
+
+    def fingerprint(self) -> str:
+        return (f"c{int(self.crop_receipt)}d{int(self.deskew)}h{self.target_text_height}"
+                f"u{self.max_upscale}e{self.max_long_edge}t{self.tile_height}o{self.tile_overlap}"
+                f"a{int(self.adaptive)}v{self.max_variants}k{self.accept_confidence}p{self.accept_price_lines}")
+
+    def tile_bands(self, height: int) -> List[Tuple[int, int, int, int]]:
+        """``(top, bottom, keep_top, keep_bottom)`` bands covering an image ``height`` tall.
+
+        Neighbouring bands overlap by ``tile_overlap`` pixels. Each band
+        keeps only the lines centred in its ``keep`` rows; these split the
+        overlaps down the middle, so every line is kept exactly once. A
+        single band is returned when tiling is off or not needed.
+        """
+        tile, overlap = self.tile_height, self.tile_overlap
+        if tile <= 0 or height <= tile or not 0 <= overlap < tile:
+            return [(0, height, 0, height)]
+        step = tile - overlap
+        bands = []
+        top = 0
+        while True:
+            bottom = min(height, top + tile)
+            keep_top = top + overlap // 2 if top else 0
+            keep_bottom = bottom - overlap // 2 if bottom < height else height
+            bands.append((top, bottom, keep_top, keep_bottom))
+            if bottom == height:
+                return bands
+            top += step
+
+# Which OCR engines extract_text runs:
+#   tesseract - Tesseract only
+#   easyocr   - EasyOCR only
+#   race      - run both, use whichever finishes first if it is confident
+#               enough, otherwise wait for the other and merge
+#   both      - run both and merge line by line on confidence
+ENGINE_POLICIES = ('tesseract', 'easyocr', 'race', 'both')
+DEFAULT_ENGINE_POLICY = os.getenv('OCR_ENGINE_POLICY', 'both')
+RACE_MIN_CONFIDENCE = float(os.getenv('OCR_RACE_CONFIDENCE', 0.8))
+
+# Both engines spend their time outside the GIL (Tesseract in a subprocess,
+# EasyOCR in torch), so a thread pool is enough to run them side by side.
+_ocr_executor: Optional[ThreadPoolExecutor] = None
+_ocr_executor_lock = threading.Lock()
+# Bands of tiled receipts get their own pool: each band waits on engine
+# futures from the one above, so sharing it could deadlock
+_tile_executor: Optional[ThreadPoolExecutor] = None
+TILE_WORKERS = int(os.getenv('OCR_TILE_WORKERS', os.cpu_count() or 2))
+
+def _get_ocr_executor() -> ThreadPoolExecutor:
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is None:
+            _ocr_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('OCR_ENGINE_THREADS', 4)),
+                thread_name_prefix='ocr-engine'
+            )
+        return _ocr_executor
+
+def _get_tile_executor() -> ThreadPoolExecutor:
+    global _tile_executor
+    with _ocr_executor_lock:
+        if _tile_executor is None:
+            _tile_executor = ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix='ocr-tile')
+        return _tile_executor
+
+def _mean_confidence(lines: List[OCRLine]) -> float:
+    if not lines:
+        return 0.0
+    return sum(line.confidence for line in lines) / len(lines)
+
+def _same_line(a: OCRLine, b: OCRLine) -> bool:
+    """True when two lines overlap for at least half the shorter one's height."""
+    overlap = min(a.bottom, b.bottom) - max(a.top, b.top)
+    return overlap >= 0.5 * min(a.height, b.height)
+
+def merge_ocr_lines(first: List[OCRLine], second: List[OCRLine]) -> List[OCRLine]:
+    """Merge two engines' lines by position, keeping the more confident reading.
+
+    Lines are matched when they overlap vertically; unmatched lines from
+    either engine are kept. The result is in top-to-bottom order.
+    """
+    merged: List[OCRLine] = []
+    unmatched = sorted(second, key=lambda line: line.top)
+    for line in sorted(first, key=lambda line: line.top):
+        match = next((other for other in unmatched if _same_line(line, other)), None)
+        if match is None:
+            merged.append(line)
+            continue
+        unmatched.remove(match)
+        merged.append(line if line.confidence >= match.confidence else match)
+    merged.extend(unmatched)
+    return sorted(merged, key=lambda line: (line.top, line.left))
 
 @dataclass
 class ReceiptItem:
@@ -37,8 +480,102 @@ class ReceiptData:
     restaurant_name: str = ""
     date: str = ""
     
+_UNWANTED_CHARS = re.compile(r'[^\w\s.$%-]')
+_PRICE_SEPARATOR = re.compile(r'(\d+)[\.,](\d{2})')
+
+# Line kinds produced by LineClassifier
+ITEM = 'item'
+TAX = 'tax'
+TOTAL = 'total'
+SUBTOTAL = 'subtotal'
+SKIP = 'skip'
+
+@dataclass
+class ClassifiedLine:
+    kind: str
+    text: str
+    price: Optional[Decimal] = None
+    quantity: int = 1
+    name: str = ""
+    header: bool = False  # the line names the restaurant
+
+_LINE_PRICE = re.compile(r'\$(\d+\.\d{2})')
+_LEADING_QUANTITY = re.compile(r'\s*(\d+)\s+')
+_NO_MARKERS: frozenset = frozenset()
+
+class LineClassifier:
+    """Classifies receipt lines in a single pass.
+
+    All marker words are folded into one alternation that is scanned once
+    over the lowercased line. A marker that contains shorter markers (such
+    as "subtotal" containing "total") stands for all of their kinds, so
+    the longest match hides nothing. Price, quantity and name are only
+    extracted for lines that can still be items.
+    """
+
+    def __init__(self, markers: Dict[str, Tuple[str, ...]]):
+        words = {word.lower() for kind_words in markers.values() for word in kind_words}
+        self._kinds_of = {
+            word: frozenset(kind for kind, kind_words in markers.items()
+                            for other in kind_words if other.lower() in word)
+            for word in words
+        }
+        alternation = '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+        self._markers = re.compile(alternation)
+
+    def markers_in(self, line: str) -> frozenset:
+        """Marker kinds present anywhere in the line."""
+        words = self._markers.findall(line.lower())
+        if not words:
+            return _NO_MARKERS
+        if len(words) == 1:
+            return self._kinds_of[words[0]]
+        return _NO_MARKERS.union(*(self._kinds_of[word] for word in words))
+
+    def classify(self, line: str) -> ClassifiedLine:
+        line = line.strip()
+        found = self.markers_in(line)
+        header = 'header' in found
+        if not line or 'noise' in found:
+            return ClassifiedLine(SKIP, line, header=header)
+
+        match = _LINE_PRICE.search(line)
+        if match is None:
+            return ClassifiedLine(SKIP, line, header=header)
+        return self.classify_priced(line, found, Decimal(match.group(1)), line.split('$', 1)[0])
+
+    def classify_priced(self, line: str, found: frozenset, price: Decimal, description: str) -> ClassifiedLine:
+        """Classify a line whose price is known; ``description`` is the text before the price."""
+        header = 'header' in found
+        if SUBTOTAL in found:
+            return ClassifiedLine(SUBTOTAL, line, price=price, header=header)
+        if TAX in found:
+            return ClassifiedLine(TAX, line, price=price, header=header)
+        if TOTAL in found:
+            return ClassifiedLine(TOTAL, line, price=price, header=header)
+
+        quantity = 1
+        quantity_match = _LEADING_QUANTITY.match(description)
+        if quantity_match:
+            quantity = max(1, int(quantity_match.group(1)))
+            description = description[quantity_match.end():]
+        name = description.strip()
+        # Totals were ruled out above, so only a bare "balance" can remain in the name
+        if len(name) <= 2 or 'balance' in name.lower():
+            return ClassifiedLine(SKIP, line, price=price, header=header)
+        return ClassifiedLine(ITEM, line, price=price, quantity=quantity, name=name, header=header)
+
+@functools.lru_cache(maxsize=8)
+def _line_classifier(markers: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> LineClassifier:
+    return LineClassifier(dict(markers))
+
 class ReceiptParser:
-    def __init__(self):
+    def __init__(self, engine_policy: Optional[str] = None, preprocess_config: Optional[PreprocessConfig] = None):
+        self.preprocess_config = preprocess_config or PreprocessConfig.from_env()
+        self.engine_policy = engine_policy or DEFAULT_ENGINE_POLICY
+        if self.engine_policy not in ENGINE_POLICIES:
+            raise ValueError(f"Unknown OCR engine policy: {self.engine_policy}")
+
         # Common patterns found in receipts
         self.patterns = {
             'price': r'\$?\s*(\d+\.\d{2})',
@@ -50,100 +587,410 @@ class ReceiptParser:
             'subtotal_indicators': ['subtotal', 'sub-total', 'sub total', 'amount'],
             'tax_indicators': ['tax', 'vat', 'gst', 'hst'],
             'tip_indicators': ['tip', 'gratuity', 'service charge'],
-            'skip_indicators': ['order', 'server', 'table', 'guest', 'check', 'receipt', 'duplicate', 'copy']
+            'skip_indicators': ['order', 'server', 'table', 'guest', 'check', 'receipt', 'duplicate', 'copy'],
+            # Markers parse_receipt classifies lines by
+            'line_noise_markers': ['order:', 'host:', 'visa', 'authorize', 'like', 'facebook', 'email'],
+            'line_subtotal_markers': ['subtotal'],
+            'line_tax_markers': ['tax'],
+            'line_total_markers': ['total', 'balance due'],
+            'line_header_markers': ['restaurant']
         }
+        self._skip_re = re.compile(
+            '|'.join(re.escape(word) for word in self.patterns['skip_indicators']), re.IGNORECASE
+        )
+        self._price_re = re.compile(self.patterns['price'])
+        self._quantity_re = re.compile(self.patterns['quantity'])
         
-    def preprocess_image(self, image_path: str) -> Image.Image:
-        """Enhanced image preprocessing optimized for receipt OCR."""
-        try:
-            with Image.open(image_path) as img:
-                # Convert to grayscale
-                gray_img = img.convert('L')
-                
-                # Increase contrast
-                gray_img = ImageOps.autocontrast(gray_img, cutoff=1)
-                
-                # Convert to numpy array for OpenCV processing
-                np_img = np.array(gray_img)
-                
-                # Apply Gaussian blur to reduce noise
-                blurred = cv2.GaussianBlur(np_img, (3, 3), 0)
-                
-                # Apply adaptive thresholding
-                thresh = cv2.adaptiveThreshold(
-                    blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY, 21, 11
+    @property
+    def line_classifier(self) -> LineClassifier:
+        markers = (
+            ('noise', tuple(self.patterns['line_noise_markers'])),
+            (SUBTOTAL, tuple(self.patterns['line_subtotal_markers'])),
+            (TAX, tuple(self.patterns['line_tax_markers'])),
+            (TOTAL, tuple(self.patterns['line_total_markers'])),
+            ('header', tuple(self.patterns['line_header_markers']))
+        )
+        return _line_classifier(markers)
+
+
+    def config_version(self) -> str:
+        """Identifies the preprocessing/parsing configuration for result caching."""
+        return f"v{PARSER_VERSION}-{self.engine_policy}-{self.preprocess_config.fingerprint()}"
+
+    def normalize_image(self, source: ImageSource,
+                        timings: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, Optional[ImageQuality]]:
+        """Decode, crop, straighten, resample and autocontrast; the grayscale every binarization starts from.
+
+        Quality signals are measured between resampling and autocontrast
+        when adaptive preprocessing is on (otherwise None). A 2-D uint8
+        array (e.g. a rendered PDF page) is taken as already-decoded
+        grayscale and may be modified in place.
+        """
+        if isinstance(source, np.ndarray):
+            gray = source
+        else:
+            # Decode in memory straight to grayscale
+            with stage_timer(timings, 'decode'), open_image_buffer(source) as buffer:
+                gray = decode_grayscale(buffer)
+                IMAGE_BYTES.observe(len(buffer))
+        IMAGE_PIXELS.observe(gray.size)
+        
+        # Crop to the receipt, straighten it and resample to the target text size
+        with stage_timer(timings, 'geometry'):
+            config = self.preprocess_config
+            tiled = config.tile_height > 0
+            plan = plan_geometry(
+                gray,
+                crop=config.crop_receipt,
+                deskew=config.deskew,
+                target_text_height=config.target_text_height,
+                max_upscale=config.max_upscale,
+                max_long_edge=0 if tiled else config.max_long_edge,
+                max_width=config.max_long_edge if tiled else 0
+            )
+            gray = apply_geometry(gray, plan)
+        logger.info(f"Geometry: cropped={plan.cropped} angle={plan.angle} "
+                    f"scale={plan.scale:.2f} size={gray.shape[1]}x{gray.shape[0]}")
+        
+        quality = None
+        if config.adaptive:
+            with stage_timer(timings, 'quality'):
+                quality = measure_quality(gray, plan.text_height)
+            logger.info(f"Quality: {quality.condition} contrast={quality.contrast:.0f} "
+                        f"sharpness={quality.sharpness:.0f} text_height={quality.text_height}")
+        
+        # Increase contrast (same result as PIL's autocontrast with cutoff=1)
+        with stage_timer(timings, 'autocontrast'):
+            cv2.LUT(gray, autocontrast_lut(gray, cutoff=1), dst=gray)
+        return gray, quality
+
+    def binarize(self, gray: np.ndarray, variant: ThresholdVariant, scratch: Tuple[np.ndarray, np.ndarray],
+                 timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Blur, threshold and dilate ``gray`` as ``variant`` says.
+
+        Ping-pongs between the two ``scratch`` buffers and returns the one
+        holding the result. ``gray`` is left untouched unless it is one of
+        them.
+        """
+        work, spare = scratch
+        image = gray
+        
+        # Apply Gaussian (or median) blur to reduce noise
+        if variant.blur or variant.median:
+            with stage_timer(timings, 'blur'):
+                if variant.median:
+                    cv2.medianBlur(image, variant.median, dst=work)
+                else:
+                    cv2.GaussianBlur(image, (variant.blur, variant.blur), 0, dst=work)
+            image, work, spare = work, spare, work
+        
+        # Apply adaptive thresholding
+        with stage_timer(timings, 'threshold'):
+            if variant.block:
+                cv2.adaptiveThreshold(
+                    image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                    cv2.THRESH_BINARY, variant.block, variant.c, dst=work
                 )
-                
-                # Apply dilation to make text more prominent
-                kernel = np.ones((2,2), np.uint8)
-                dilated = cv2.dilate(thresh, kernel, iterations=1)
-                
-                # Convert back to PIL Image
-                return Image.fromarray(dilated)
+            else:
+                cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=work)
+        image, work, spare = work, spare, work
+        
+        # Apply dilation to make text more prominent
+        if variant.dilate:
+            with stage_timer(timings, 'dilate'):
+                cv2.dilate(image, np.ones((variant.dilate, variant.dilate), np.uint8), dst=work, iterations=1)
+            image = work
+        return image
+
+    def preprocess_image(self, source: ImageSource, timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Enhanced image preprocessing optimized for receipt OCR.
+
+        Runs entirely on numpy arrays, ping-ponging between the decoded
+        buffer and one work buffer; the returned array is what both OCR
+        engines read. Uses the best-ranked threshold variant for the
+        image's quality (the standard one when adaptive is off).
+        """
+        try:
+            gray, quality = self.normalize_image(source, timings=timings)
+            variant = rank_variants(quality, 1)[0] if quality is not None else VARIANTS['standard']
+            return self.binarize(gray, variant, (np.empty_like(gray), gray), timings=timings)
         except Exception as e:
             logger.error(f"Error in preprocessing: {str(e)}")
             raise
 
-    def extract_text(self, image_path: str) -> List[str]:
-        """Extract text from image and return as list of lines."""
+    def extract_layout(self, source: ImageSource, timings: Optional[Dict[str, float]] = None) -> ReceiptLayout:
+        """OCR an image into cleaned words grouped into lines, with the price column located.
+
+        With adaptive preprocessing, threshold variants are OCR'd best guess
+        first until one reads confidently with enough prices; otherwise the
+        variant with the most price lines (then confidence) is kept.
+        """
         try:
-            # Preprocess image
-            processed_image = self.preprocess_image(image_path)
-            
-            # Get text from Tesseract
-            tesseract_text = pytesseract.image_to_string(
-                processed_image,
-                config='--psm 6 --oem 3',
-                lang='eng'
-            ).strip()
-            
-            # Get text from EasyOCR
-            reader = easyocr.Reader(['en'])
-            easyocr_result = reader.readtext(np.array(processed_image))
-            easyocr_text = '\n'.join([text[1] for text in easyocr_result])
+            gray, quality = self.normalize_image(source, timings=timings)
+            config = self.preprocess_config
+            if quality is None:
+                variants, condition = [VARIANTS['standard']], 'fixed'
+            else:
+                variants, condition = rank_variants(quality, config.max_variants), quality.condition
             
-            # Combine results and split into lines
-            all_lines = set(tesseract_text.splitlines() + easyocr_text.splitlines())
-            
-            # Clean and filter lines
-            cleaned_lines = []
-            for line in all_lines:
-                cleaned = self.clean_line(line)
-                if cleaned and not self.is_skip_line(cleaned):
-                    cleaned_lines.append(cleaned)
+            # Two buffers shared by every variant; gray is kept for the next one
+            scratch = (np.empty_like(gray), np.empty_like(gray))
+            best = None
+            for passes, variant in enumerate(variants, 1):
+                layout = self.ocr_layout(self.binarize(gray, variant, scratch, timings=timings), timings=timings)
+                confidence = _mean_confidence(layout.lines)
+                price_lines = sum(1 for line in layout.lines if layout.price_index(line) is not None)
+                logger.info(f"Variant {variant.name}: confidence={confidence:.2f} price_lines={price_lines}")
+                if best is None or (price_lines, confidence) > best[0]:
+                    best = ((price_lines, confidence), layout, variant)
+                if confidence >= config.accept_confidence and price_lines >= config.accept_price_lines:
+                    break
+            _, layout, variant = best
+            OCR_PASSES.observe(passes)
+            OCR_VARIANTS.inc(variant=variant.name, condition=condition)
             
             logger.info("Extracted lines:")
-            for line in cleaned_lines:
-                logger.info(f"  {line}")
-                
-            return cleaned_lines
+            for line in layout.lines:
+                logger.info(f"  {line.text}")
+            return layout
             
         except Exception as e:
             logger.error(f"Error in text extraction: {str(e)}")
             raise
 
+    def ocr_layout(self, image: np.ndarray, timings: Optional[Dict[str, float]] = None) -> ReceiptLayout:
+        """OCR a binarized image, in bands when it is tall, and lay out the lines."""
+        bands = self.preprocess_config.tile_bands(image.shape[0])
+        if len(bands) > 1:
+            # Lines are cleaned band by band as the bands come in
+            with stage_timer(timings, 'ocr'):
+                ordered: List[OCRLine] = []
+                for band_lines in self.ocr_tiles(image, bands):
+                    ordered.extend(order_lines(band_lines, clean=self.clean_line))
+            with stage_timer(timings, 'layout'):
+                return layout_from_lines(ordered)
+        
+        # Run the OCR engines and keep one reading per line position
+        with stage_timer(timings, 'ocr'):
+            ocr_lines = self.run_ocr(image)
+        with stage_timer(timings, 'layout'):
+            return build_layout(ocr_lines, clean=self.clean_line)
+
+    def extract_text(self, source: ImageSource, timings: Optional[Dict[str, float]] = None) -> List[str]:
+        """Extract text from image and return as list of lines."""
+        layout = self.extract_layout(source, timings=timings)
+        return [line for line in layout.texts() if not self.is_skip_line(line)]
+
+    def extract_document_text(self, buffer, kind: str, timings: Optional[Dict[str, float]] = None) -> List[str]:
+        """Lines of a PDF, HTML or text receipt, read from its text layer without OCR.
+
+        PDF pages with no text layer (scans) are rendered and OCR'd.
+        """
+        with stage_timer(timings, 'text_layer'):
+            if kind == PDF:
+                pages = pdf_pages(buffer)
+            elif kind == HTML:
+                pages = [html_lines(buffer)]
+            else:
+                pages = [text_lines(buffer)]
+
+        all_lines: List[str] = []
+        for page in pages:
+            if isinstance(page, np.ndarray):
+                all_lines.extend(self.extract_text(page, timings=timings))
+            else:
+                all_lines.extend(self.clean_lines(page))
+        return all_lines
+
+    def clean_lines(self, lines: List[str]) -> List[str]:
+        """Clean lines and drop empty and skip lines."""
+        cleaned_lines = []
+        for line in lines:
+            cleaned = self.clean_line(line)
+            if cleaned and not self.is_skip_line(cleaned):
+                cleaned_lines.append(cleaned)
+        
+        logger.info("Extracted lines:")
+        for line in cleaned_lines:
+            logger.info(f"  {line}")
+            
+        return cleaned_lines
+
+    def ocr_tiles(self, image: np.ndarray, bands: List[Tuple[int, int, int, int]]) -> Iterator[List[OCRLine]]:
+        """OCR horizontal bands of a tall image in parallel, yielding each band's lines in page order.
+
+        At most TILE_WORKERS bands are in flight, so OCR memory depends on
+        the band size rather than the receipt's length. A band's lines are
+        moved into page coordinates and limited to the rows it keeps, which
+        drops the second reading of every line in an overlap.
+        """
+        logger.info(f"OCR of {image.shape[1]}x{image.shape[0]} image in {len(bands)} bands")
+        executor = _get_tile_executor()
+        in_flight: "queue.SimpleQueue[Tuple[Future, Tuple[int, int, int, int]]]" = queue.SimpleQueue()
+        pending = iter(bands)
+
+        def submit_next() -> None:
+            band = next(pending, None)
+            if band is not None:
+                # Bands are views into the preprocessed image, not copies
+                in_flight.put((executor.submit(self.run_ocr, image[band[0]:band[1]]), band))
+
+        for _ in range(min(TILE_WORKERS, len(bands))):
+            submit_next()
+        try:
+            while not in_flight.empty():
+                future, (top, _, keep_top, keep_bottom) = in_flight.get()
+                band_lines = future.result()
+                submit_next()
+                yield [
+                    line.shifted(top) for line in band_lines
+                    if keep_top <= top + (line.top + line.bottom) / 2 < keep_bottom
+                ]
+        finally:
+            # Abandoned early (an engine failed): don't OCR the rest
+            while not in_flight.empty():
+                in_flight.get()[0].cancel()
+
+    def run_engine(self, engine: str, image: np.ndarray) -> List[OCRLine]:
+        """Run one OCR engine, timing it as a stage and counting failures."""
+        lines = self.tesseract_lines if engine == 'tesseract' else self.easyocr_lines
+        try:
+            with stage_timer(None, engine):
+                return lines(image)
+        except Exception:
+            ENGINE_FAILURES.inc(engine=engine)
+            raise
+
+    def tesseract_lines(self, image: np.ndarray) -> List[OCRLine]:
+        """Run Tesseract and group its words into lines with confidences."""
+        data = get_tesseract_engine().image_to_data(image)
+        grouped: Dict[Tuple[int, int, int], List[int]] = {}
+        for i, word in enumerate(data['text']):
+            if not word.strip() or float(data['conf'][i]) < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            grouped.setdefault(key, []).append(i)
+
+        lines = []
+        for indices in grouped.values():
+            indices.sort(key=lambda i: data['left'][i])
+            words = [
+                OCRWord(
+                    text=data['text'][i],
+                    confidence=float(data['conf'][i]) / 100,
+                    left=data['left'][i],
+                    top=data['top'][i],
+                    right=data['left'][i] + data['width'][i],
+                    bottom=data['top'][i] + data['height'][i]
+                )
+                for i in indices
+            ]
+            lines.append(OCRLine(
+                text=' '.join(word.text for word in words),
+                confidence=sum(word.confidence for word in words) / len(words),
+                top=min(word.top for word in words),
+                bottom=max(word.bottom for word in words),
+                left=words[0].left,
+                engine='tesseract',
+                words=words
+            ))
+        return lines
+
+    def easyocr_lines(self, image: np.ndarray) -> List[OCRLine]:
+        """Run EasyOCR and join its text boxes into lines by vertical position."""
+        reader = get_easyocr_reader(('en',))
+        batcher = get_recognition_batcher()
+        if batcher is None:
+            results = reader.readtext(image)
+        else:
+            horizontal_list, free_list = reader.detect(image)
+            results = batcher.recognize(image, horizontal_list[0], free_list[0])
+
+        detections = []
+        for box, text, confidence in results:
+            xs = [point[0] for point in box]
+            ys = [point[1] for point in box]
+            detections.append((int(min(ys)), int(max(ys)), int(min(xs)), text, float(confidence), int(max(xs))))
+
+        lines: List[OCRLine] = []
+        current: List[Tuple] = []
+        for detection in sorted(detections, key=lambda d: (d[0] + d[1]) / 2):
+            center = (detection[0] + detection[1]) / 2
+            if current and not (min(d[0] for d in current) <= center <= max(d[1] for d in current)):
+                lines.append(self._easyocr_line(current))
+                current = []
+            current.append(detection)
+        if current:
+            lines.append(self._easyocr_line(current))
+        return lines
+
+    def _easyocr_line(self, detections: List[Tuple]) -> OCRLine:
+        detections = sorted(detections, key=lambda d: d[2])
+        return OCRLine(
+            text=' '.join(d[3] for d in detections),
+            confidence=sum(d[4] for d in detections) / len(detections),
+            top=min(d[0] for d in detections),
+            bottom=max(d[1] for d in detections),
+            left=detections[0][2],
+            engine='easyocr',
+            # Each text box is one word; a box may hold several words of the same column
+            words=[OCRWord(d[3], d[4], left=d[2], top=d[0], right=d[5], bottom=d[1]) for d in detections]
+        )
+
+    def run_ocr(self, image: np.ndarray) -> List[OCRLine]:
+        """Run the OCR engines selected by the engine policy."""
+        if self.engine_policy in ('tesseract', 'easyocr'):
+            return self.run_engine(self.engine_policy, image)
+
+        executor = _get_ocr_executor()
+        futures = {
+            executor.submit(self.run_engine, 'tesseract', image): 'tesseract',
+            executor.submit(self.run_engine, 'easyocr', image): 'easyocr'
+        }
+        results: Dict[str, List[OCRLine]] = {}
+        errors: Dict[str, Exception] = {}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                engine = futures[future]
+                try:
+                    results[engine] = future.result()
+                except Exception as e:
+                    logger.error(f"{engine} failed: {str(e)}")
+                    errors[engine] = e
+                    continue
+                # The slower engine keeps running; its result is just ignored
+                if self.engine_policy == 'race' and _mean_confidence(results[engine]) >= RACE_MIN_CONFIDENCE:
+                    logger.info(f"Using {engine} result (race won)")
+                    return results[engine]
+
+        if not results:
+            raise next(iter(errors.values()))
+        if len(results) == 1:
+            return next(iter(results.values()))
+        return merge_ocr_lines(results['tesseract'], results['easyocr'])
+
     def clean_line(self, line: str) -> str:
         """Clean and normalize a line of text."""
         # Remove unwanted characters
-        line = re.sub(r'[^\w\s.$%-]', '', line)
+        line = _UNWANTED_CHARS.sub('', line)
         
         # Normalize spaces
         line = ' '.join(line.split())
         
         # Normalize price format
-        line = re.sub(r'(\d+)[\.,](\d{2})', r'\1.\2', line)
+        line = _PRICE_SEPARATOR.sub(r'\1.\2', line)
         
         return line.strip()
 
     def is_skip_line(self, line: str) -> bool:
         """Check if line should be skipped."""
-        lower_line = line.lower()
-        return any(indicator in lower_line for indicator in self.patterns['skip_indicators'])
+        return self._skip_re.search(line) is not None
 
     def extract_price(self, line: str) -> Optional[Decimal]:
         """Extract price from line."""
-        match = re.search(self.patterns['price'], line)
+        match = self._price_re.search(line)
         if match:
             try:
                 return Decimal(match.group(1))
@@ -153,7 +1000,7 @@ class ReceiptParser:
 
     def extract_quantity(self, line: str) -> int:
         """Extract quantity from line."""
-        match = re.search(self.patterns['quantity'], line)
+        match = self._quantity_re.search(line)
         if match:
             try:
                 return int(match.group(1))
@@ -166,106 +1013,86 @@ class ReceiptParser:
         lower_line = line.lower()
         return any(indicator in lower_line for indicator in indicators)
 
-    def parse_receipt(self, text_lines: List[str]) -> ReceiptData:
-        """Parse receipt text into structured data."""
+    def classify_layout(self, layout: ReceiptLayout) -> Iterator[ClassifiedLine]:
+        """Classify OCR lines in one top-to-bottom sweep, reading prices from the price column.
+
+        A line's description is the words left of its price word. A line
+        with a name but no price is held over for the next line, so a name
+        wrapped above a price-only line is still paired with its price.
+        """
+        classifier = self.line_classifier
+        pending = ''
+        for ocr_line in layout.lines:
+            text = ocr_line.text
+            found = classifier.markers_in(text)
+            if self.is_skip_line(text) or 'noise' in found:
+                pending = ''
+                yield ClassifiedLine(SKIP, text, header='header' in found)
+                continue
+
+            index = layout.price_index(ocr_line)
+            if index is None:
+                pending = '' if found else text
+                yield ClassifiedLine(SKIP, text, header='header' in found)
+                continue
+
+            # Unit prices and stray '$' signs before the price aren't part of the name
+            description = ' '.join(
+                word.text for word in ocr_line.words[:index] if word.text != '$' and word.amount is None
+            )
+            if not description.strip() and pending:
+                description = pending
+            pending = ''
+            price = Decimal(ocr_line.words[index].amount)
+            yield classifier.classify_priced(text, found, price, description)
+
+    def parse_receipt(self, text_lines: Union[List[str], ReceiptLayout]) -> ReceiptData:
+        """Parse receipt text into structured data.
+
+        Takes plain lines (text-layer documents) or an OCR ``ReceiptLayout``,
+        whose word positions let names be paired with the price column.
+        """
         items: List[ReceiptItem] = []
         subtotal = tax = tip = total = Decimal('0')
         restaurant_name = ""
         
-        # First pass: find restaurant name
-        for line in text_lines:
-            if 'RESTAURANT' in line.upper():
-                restaurant_name = line.strip()
-                break
-        
-        # Second pass: find items and totals
-        for line in text_lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            logger.info(f"Processing line: {line}")
-            
-            # Skip lines that are clearly not items
-            if any(skip in line.upper() for skip in ['ORDER:', 'HOST:', 'VISA', 'AUTHORIZE', 'LIKE', 'FACEBOOK', 'EMAIL']):
-                continue
+        # Single pass: classify each line once
+        if isinstance(text_lines, ReceiptLayout):
+            classified = self.classify_layout(text_lines)
+        else:
+            classifier = self.line_classifier
+            classified = (classifier.classify(raw_line) for raw_line in text_lines)
+        for line in classified:
+            if line.header and not restaurant_name:
+                restaurant_name = line.text
             
-            # Look for price in the line
-            price_match = re.search(r'\$(\d+\.\d{2})', line)
-            if not price_match:
-                continue
-            
-            price = Decimal(price_match.group(1))
-            
-            # Check for totals
-            line_lower = line.lower()
-            if 'subtotal' in line_lower:
+            if line.kind == SKIP or line.kind == SUBTOTAL:
                 # We'll calculate subtotal from items instead of using the one from receipt
                 continue
             
-            if 'tax' in line_lower:
-                tax = price
-                logger.info(f"Found tax: ${price}")
+            if line.kind == TAX:
+                tax = line.price
+                logger.info(f"Found tax: ${line.price}")
                 continue
             
-            if any(total_word in line_lower for total_word in ['total', 'balance due']) and 'subtotal' not in line_lower:
-                total = price
-                logger.info(f"Found total: ${price}")
+            if line.kind == TOTAL:
+                total = line.price
+                logger.info(f"Found total: ${line.price}")
                 continue
             
-            # If we get here, this might be an item
-            # Look for quantity at the start of the line
-            quantity = 1
-            quantity_match = re.match(r'^\s*(\d+)\s+', line)
-            if quantity_match:
-                quantity = int(quantity_match.group(1))
-                # Remove quantity from the start of the line
-                line = re.sub(r'^\s*\d+\s+', '', line)
-            
-            # Remove the price from the line to get the item name
-            name = line.split('$')[0].strip()
-            
-            # Clean up the name and skip if it's too short or contains unwanted words
-            if len(name) > 2 and not any(skip in name.upper() for skip in ['SUBTOTAL', 'TAX', 'TOTAL', 'BALANCE']):
-                # If quantity > 1, split into separate items with divided price
-                price_per_item = round_decimal(price / Decimal(quantity))
-                for i in range(quantity):
-                    item_name = f"{name} {i + 1}" if quantity > 1 else name
-                    items.append(ReceiptItem(
-                        name=item_name,
-                        price=price_per_item,
-                        quantity=1
-                    ))
-                    logger.info(f"Found item: {item_name} = ${price_per_item}")
+            # If quantity > 1, split into separate items with divided price
+            quantity = line.quantity
+            price_per_item = round_decimal(line.price / Decimal(quantity))
+            for i in range(quantity):
+                item_name = f"{line.name} {i + 1}" if quantity > 1 else line.name
+                items.append(ReceiptItem(
+                    name=item_name,
+                    price=price_per_item,
+                    quantity=1
+                ))
+                logger.info(f"Found item: {item_name} = ${price_per_item}")
         
         # Validate the extracted data
-        if not items:
-            # Try one more pass with known items from this receipt
-            known_items = {
-                'CHICKEN BURGER': (Decimal('8.79'), 1),
-                'LARGE DRINK': (Decimal('4.99'), 1),
-                'FRENCH FRIES': (Decimal('3.79'), 1),
-                'GREY GOOSE LIME': (Decimal('19.38'), 2),  # Note the quantity of 2
-                'GRILL OCTOPUS': (Decimal('17.99'), 1),
-                'OYSTERS GREEN NZ': (Decimal('22.79'), 1),
-                'SALMON TARTAR': (Decimal('15.99'), 1)
-            }
-            
-            for line in text_lines:
-                for item_name, (item_price, item_quantity) in known_items.items():
-                    if item_name in line.upper() and str(item_price) in line:
-                        # If quantity > 1, split into separate items with divided price
-                        price_per_item = round_decimal(item_price / Decimal(item_quantity))
-                        for i in range(item_quantity):
-                            final_name = f"{item_name.title()} {i + 1}" if item_quantity > 1 else item_name.title()
-                            items.append(ReceiptItem(
-                                name=final_name,
-                                price=price_per_item,
-                                quantity=1
-                            ))
-                            logger.info(f"Found item in second pass: {final_name} = ${price_per_item}")
-        
-        # If still no items found, raise error
         if not items:
             raise ValueError("No items found in receipt")
         
@@ -295,18 +1122,41 @@ class ReceiptParser:
             date=""
         )
 
-def parse_receipt_image(image_path: str) -> Dict:
-    """Main function to parse receipt image."""
+# Parsed results keyed by upload content, so re-uploads skip OCR entirely
+result_cache = create_result_cache()
+
+def parse_receipt_image(source: ImageSource, timings: Optional[Dict[str, float]] = None) -> Dict:
+    """Main function to parse receipt image.
+
+    ``source`` may be a path, the encoded bytes (or a memoryview of them)
+    or a binary file-like object; nothing is written to disk. Besides
+    images it accepts PDF, HTML and plain-text receipts, whose text is
+    parsed directly instead of being OCR'd. Pass a dict as ``timings``
+    to collect seconds spent per pipeline stage.
+    """
     parser = ReceiptParser()
-    
-    # Extract text from image
-    text_lines = parser.extract_text(image_path)
+    with open_image_buffer(source) as buffer:
+        cache_key = None
+        if result_cache is not None:
+            cache_key = content_key(buffer, parser.config_version())
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Result cache hit")
+                return cached
+
+        # Digital receipts carry their text; only images (and scanned PDF pages) need OCR
+        kind = document_kind(buffer)
+        if kind == IMAGE:
+            lines = parser.extract_layout(buffer, timings=timings)
+        else:
+            lines = parser.extract_document_text(buffer, kind, timings=timings)
     
     # Parse receipt data
-    receipt_data = parser.parse_receipt(text_lines)
+    with stage_timer(timings, 'parse'):
+        receipt_data = parser.parse_receipt(lines)
     
     # Convert to dictionary format
-    return {
+    result = {
         "items": [{"name": item.name, "quantity": item.quantity, "price": float(item.price)} 
                  for item in receipt_data.items],
         "subtotal": float(receipt_data.subtotal),
@@ -315,4 +1165,12 @@ def parse_receipt_image(image_path: str) -> Dict:
         "total": float(receipt_data.total),
         "restaurant_name": receipt_data.restaurant_name,
         "date": receipt_data.date
-    } 
\ No newline at end of file
+    }
+    
+    if cache_key is not None:
+        result_cache.set(cache_key, result)
+    return result
+
+def get_result_cache_stats() -> Dict:
+    """Hit-rate counters for the parsed-result cache."""
+    return result_cache.stats() if result_cache is not None else {}
@@ -1,39 +1,181 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Request, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, g
 import os
-from algorithm import parse_receipt_image
-from PIL import Image, UnidentifiedImageError
+import sys
+import time
+import gzip
+import hashlib
+import shutil
+import mmap
+import tempfile
+from jobs import create_job_backend, run_ocr_job, QueueFullError, DONE, FAILED
+from batch import parse_receipt_images, BatchReport
+from session_store import create_session_interface
+from share_store import create_shared_splits
+from receipt_documents import check_image_pixels, ImageRejectedError, ImageTooLargeError
+from split_engine import split_receipt, check_totals, from_cents, LiveSplit, TotalsMismatchError
+from metrics import REGISTRY, REQUEST_SECONDS, start_trace, end_trace, server_timing
 import logging
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import json
 from decimal import Decimal, ROUND_HALF_UP
-from collections import defaultdict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Uploads up to this size are kept in memory; larger ones spill to a temp file
+UPLOAD_SPILL_BYTES = int(os.getenv('UPLOAD_SPILL_BYTES', 8 * 1024 * 1024))
+
+# Request body limits: one receipt, and a whole /api/batch of them
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+MAX_BATCH_BYTES = int(os.getenv('MAX_BATCH_BYTES', 256 * 1024 * 1024))
+BATCH_PATH = '/api/batch'
+
+class UploadRequest(Request):
+    @property
+    def max_content_length(self):
+        # A batch carries many receipts in one body
+        if self.path == BATCH_PATH:
+            return MAX_BATCH_BYTES
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Werkzeug writes anything over 500 KB to disk; keep phone photos in memory
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPILL_BYTES)
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+# The upload form shrinks photos to this long edge before sending them
+app.config['UPLOAD_MAX_LONG_EDGE'] = int(os.getenv('UPLOAD_MAX_LONG_EDGE', 3000))
 app.secret_key = 'your-secret-key-here'  # Required for session and flash messages
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Routes under this prefix are stateless JSON endpoints
+API_PREFIX = '/api/'
+# Shared split pages are the same for every viewer and never read the session
+SHARE_PREFIX = '/s/'
+SHARE_MAX_AGE = int(os.getenv('SHARE_MAX_AGE', 3600))
+
+# Receipt and split state lives server-side; the cookie only carries a session id
+session_interface = create_session_interface(stateless_prefixes=(API_PREFIX, SHARE_PREFIX))
+if session_interface is not None:
+    app.session_interface = session_interface
+
+# Images are OCR'd; PDF, HTML and text receipts are parsed from their text
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'html', 'htm', 'txt'}
+
+# OCR runs off the request thread; uploads get a job id to poll
+job_backend = create_job_backend()
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Each open /jobs/<id>/events stream holds one of the worker's
+# GUNICORN_THREADS request threads, so the processing page polls unless
+# JOB_EVENTS=1, and a stream is ended after SSE_STREAM_SECONDS for the
+# browser's EventSource to reconnect
+JOB_EVENTS = os.getenv('JOB_EVENTS', '0') == '1'
+SSE_STREAM_SECONDS = int(os.getenv('SSE_STREAM_SECONDS', 5))
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Limits for /api/batch
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', 500))
+# Each batch worker process loads its own copy of the OCR models
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', min(2, os.cpu_count() or 1)))
+
+# Send per-stage timings to the browser in a Server-Timing header
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
+
+def ocr_stats(name):
+    """A stats() callable for ``algorithm.<name>`` that reports nothing until OCR has been loaded.
+
+    The OCR stack (cv2, EasyOCR/torch, Tesseract) is imported by the first
+    OCR job, not by the web app, so /metrics must not import it either.
+    """
+    def stats():
+        algorithm = sys.modules.get('algorithm')
+        return getattr(algorithm, name)() if algorithm is not None else {}
+    return stats
+
+# Existing component counters, exported as gauges on /metrics
+REGISTRY.register_stats('easyocr_reader', ocr_stats('get_reader_stats'))
+REGISTRY.register_stats('easyocr_batcher', ocr_stats('get_batcher_stats'))
+REGISTRY.register_stats('tesseract', ocr_stats('get_tesseract_stats'))
+REGISTRY.register_stats('result_cache', ocr_stats('get_result_cache_stats'))
+REGISTRY.register_stats('ocr_jobs', job_backend.stats)
+if session_interface is not None:
+    REGISTRY.register_stats('session', session_interface.stats)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def wants_json():
+    """True when the client asked for a JSON response rather than a page."""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def buffer_upload(file):
+    """Take the upload out of the request: bytes, or a temp file above UPLOAD_SPILL_BYTES.
+
+    The request's own streams are closed when it ends, so the job needs a copy.
+    """
+    head = file.stream.read(UPLOAD_SPILL_BYTES + 1)
+    if len(head) <= UPLOAD_SPILL_BYTES:
+        return head
+    spill = tempfile.TemporaryFile()
+    spill.write(head)
+    shutil.copyfileobj(file.stream, spill)
+    spill.seek(0)
+    return spill
+
+def check_upload(upload):
+    """Reject an image that is over MAX_IMAGE_PIXELS, or whose size can't be read, before anything decodes it."""
+    if isinstance(upload, bytes):
+        check_image_pixels(upload)
+        return
+    # A TIFF's dimensions can sit at the end of the file; map it rather than read it
+    with mmap.mmap(upload.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        check_image_pixels(buffer)
+
 def round_decimal(value: Decimal) -> Decimal:
     """Round decimal to 2 places using ROUND_HALF_UP."""
     return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    start_trace()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed responses are timed up to their headers
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    REQUEST_SECONDS.observe(
+        elapsed, endpoint=request.endpoint or 'unmatched', method=request.method, status=str(response.status_code)
+    )
+    trace = end_trace() or {}
+    load_seconds = getattr(session, 'load_seconds', 0.0)
+    if load_seconds:
+        trace = {'session_load': load_seconds, **trace}
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(trace, elapsed)
+    return response
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit = MAX_BATCH_BYTES if request.path == BATCH_PATH else MAX_CONTENT_LENGTH
+    message = f'That upload is too large. The limit is {limit // (1024 * 1024)} MB.'
+    if request.path.startswith(API_PREFIX) or wants_json():
+        return jsonify({"error": message}), 413
+    flash(message, 'warning')
+    return render_template('index.html'), 413
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.before_request
 def make_session_permanent():
-    session.permanent = True
+    # The JSON API and shared pages are stateless and never touch the session
+    if not request.path.startswith((API_PREFIX, SHARE_PREFIX)):
+        session.permanent = True
 
 def get_session_data():
     """Get required session data or return None if missing."""
@@ -46,6 +188,26 @@ def get_session_data():
         logger.error(f"Error getting session data: {str(e)}")
         return None
 
+def receipt_fingerprint(parsed_data):
+    """Digest of the prices, tax and tip a live split was built from."""
+    amounts = [str(item['price']) for item in parsed_data['items']] + [str(parsed_data['tax']), str(parsed_data['tip'])]
+    return hashlib.sha256('|'.join(amounts).encode('utf-8')).hexdigest()[:16]
+
+def load_live_split(session_data):
+    """The assign page's running split from the session, or a fresh one for the current items and people."""
+    parsed_data = session_data['parsed_data']
+    people = session_data['people_names']
+    state = session.get('live_split')
+    if (state is not None and state['people'] == people
+            and state.get('receipt') == receipt_fingerprint(parsed_data)):
+        return LiveSplit.from_dict(state)
+    return LiveSplit.create(
+        [item['price'] for item in parsed_data['items']], people, tax=parsed_data['tax'], tip=parsed_data['tip']
+    )
+
+def save_live_split(live, parsed_data):
+    session['live_split'] = {**live.to_dict(), 'receipt': receipt_fingerprint(parsed_data)}
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -59,35 +221,244 @@ def index():
             return redirect(request.url)
             
         if not allowed_file(file.filename):
-            flash('Invalid file type. Please upload a PNG, JPG, or GIF file.', 'warning')
+            flash('Invalid file type. Please upload a PNG, JPG, GIF, PDF, HTML or TXT file.', 'warning')
             return redirect(request.url)
             
+        filename = secure_filename(file.filename)
+        upload = buffer_upload(file)
+
         try:
-            # Save the file
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            logger.info(f"Processing receipt: {filename}")
-            
-            # Process the receipt
-            parsed_data = parse_receipt_image(filepath)
-            
-            # Store results in session
-            session['parsed_data'] = parsed_data
-            
-            # Clean up the file
-            os.remove(filepath)
-            
-            return redirect(url_for('safety'))
-            
-        except Exception as e:
-            logger.error(f"Error processing receipt: {str(e)}")
-            flash(f'An error occurred while processing the receipt: {str(e)}', 'danger')
-            return redirect(request.url)
+            check_upload(upload)
+        except ImageRejectedError as e:
+            if hasattr(upload, 'close'):
+                upload.close()
+            logger.warning(f"Rejecting upload {filename}: {str(e)}")
+            if wants_json():
+                return jsonify({"error": str(e)}), e.status
+            hint = ' Please upload a smaller photo.' if isinstance(e, ImageTooLargeError) else ''
+            flash(f'{str(e)}.{hint}', 'warning')
+            return render_template('index.html'), e.status
+
+        try:
+            job = job_backend.submit(run_ocr_job, upload)
+        except QueueFullError as e:
+            if hasattr(upload, 'close'):
+                upload.close()
+            logger.warning(f"Rejecting upload: {str(e)}")
+            if wants_json():
+                response = jsonify({"error": "Too many receipts are being processed, please retry shortly"})
+            else:
+                flash('We are processing a lot of receipts right now. Please try again in a moment.', 'warning')
+                response = app.make_response(render_template('index.html'))
+            response.status_code = 429
+            response.headers['Retry-After'] = '5'
+            return response
+
+        logger.info(f"Processing receipt: {filename} as job {job.id}")
+
+        if wants_json():
+            return jsonify({
+                "job_id": job.id,
+                "status_url": url_for('job_status', job_id=job.id),
+                "events_url": url_for('job_events', job_id=job.id)
+            }), 202
+        return redirect(url_for('job_wait', job_id=job.id))
             
     return render_template('index.html')
 
+def job_payload(job):
+    payload = job.to_dict()
+    if job.finished:
+        payload['redirect'] = url_for('job_result', job_id=job.id)
+    return payload
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_backend.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_payload(job))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    if job_backend.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        deadline = time.monotonic() + SSE_STREAM_SECONDS
+        last_status = None
+        while time.monotonic() < deadline:
+            job = job_backend.wait(job_id, timeout=min(5, max(0.1, deadline - time.monotonic())))
+            if job is None:
+                # Expired mid-stream; the reconnect gets a 404 and the page falls back to polling
+                return
+            if job.status != last_status:
+                last_status = job.status
+                yield f"data: {json.dumps(job_payload(job))}\n\n"
+            if job.finished:
+                return
+            # Comment line keeps proxies from closing an idle stream
+            yield ': keep-alive\n\n'
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/jobs/<job_id>/wait')
+def job_wait(job_id):
+    if job_backend.get(job_id) is None:
+        flash('That receipt is no longer being processed. Please upload it again.', 'warning')
+        return redirect(url_for('index'))
+    return render_template('processing.html', job_id=job_id, use_events=JOB_EVENTS)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Move a finished job's output into the session and continue the flow."""
+    job = job_backend.get(job_id)
+    if job is None:
+        flash('That receipt is no longer being processed. Please upload it again.', 'warning')
+        return redirect(url_for('index'))
+    if job.status == FAILED:
+        flash(f'An error occurred while processing the receipt: {job.error}', 'danger')
+        return redirect(url_for('index'))
+    if job.status != DONE:
+        return redirect(url_for('job_wait', job_id=job_id))
+
+    session['parsed_data'] = job.result
+    # A new receipt: the running split starts over
+    session.pop('live_split', None)
+    return redirect(url_for('safety'))
+
+@app.route(BATCH_PATH, methods=['POST'])
+def api_batch():
+    """Parse many receipts at once, streaming one NDJSON line per receipt as it completes."""
+    files = [f for f in request.files.getlist('receipts') if f.filename]
+    if not files:
+        return jsonify({"error": "Upload one or more files as 'receipts'"}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({"error": f"At most {MAX_BATCH_FILES} receipts per batch"}), 413
+    rejected = [f.filename for f in files if not allowed_file(f.filename)]
+    if rejected:
+        return jsonify({"error": "Unsupported file types", "files": rejected}), 400
+
+    names = [secure_filename(f.filename) for f in files]
+    sources = [f.read() for f in files]
+    rejected = {}
+    for name, source in zip(names, sources):
+        try:
+            check_image_pixels(source)
+        except ImageRejectedError as e:
+            rejected[name] = e
+    if rejected:
+        status = max(e.status for e in rejected.values())
+        return jsonify({
+            "error": "Images over the size limit or in an unreadable format",
+            "files": list(rejected),
+            "reasons": {name: str(e) for name, e in rejected.items()}
+        }), status
+    logger.info(f"Batch of {len(sources)} receipts on {BATCH_WORKERS} workers")
+
+    def stream():
+        report = BatchReport()
+        for record in parse_receipt_images(sources, workers=BATCH_WORKERS, names=names):
+            report.add(record)
+            yield json.dumps(record) + '\n'
+        yield json.dumps({'summary': report.summary()}) + '\n'
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+def api_amount(payload, field, default=None):
+    """A non-negative Decimal from a JSON body, or ValueError naming the field."""
+    value = payload.get(field, default)
+    if value is None:
+        raise ValueError(f"'{field}' is required")
+    try:
+        amount = Decimal(str(value))
+    except ArithmeticError:
+        raise ValueError(f"'{field}' must be a number")
+    if not amount.is_finite() or amount < 0:
+        raise ValueError(f"'{field}' must be a non-negative amount")
+    return amount
+
+@app.route('/api/parse', methods=['POST'])
+def api_parse():
+    """Parse one receipt synchronously and return its items and totals as JSON."""
+    file = request.files.get('receipt')
+    if file is None or not file.filename:
+        return jsonify({"error": "Upload a receipt image as 'receipt'"}), 400
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type. Please upload a PNG, JPG, GIF, PDF, HTML or TXT file."}), 400
+
+    upload = buffer_upload(file)
+    try:
+        check_upload(upload)
+        return jsonify(run_ocr_job(upload))
+    except ImageRejectedError as e:
+        if hasattr(upload, 'close'):
+            upload.close()
+        return jsonify({"error": str(e)}), e.status
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+    except Exception as e:
+        logger.error(f"Error in api_parse: {str(e)}")
+        return jsonify({"error": "Failed to process receipt"}), 500
+
+@app.route('/api/split', methods=['POST'])
+def api_split():
+    """Split edited items, tax and tip between people.
+
+    Takes ``people``, ``items`` (each with ``name``, ``price`` and
+    ``assigned_to``) and ``subtotal``/``tax``/``tip``/``total``, checked
+    the same way as the safety page.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Send a JSON object"}), 400
+
+    try:
+        people = data.get('people')
+        if not isinstance(people, list) or not people:
+            raise ValueError("'people' must be a non-empty list of names")
+        if not all(isinstance(name, str) and name.strip() for name in people):
+            raise ValueError("Please provide names for all people")
+        if len(set(people)) != len(people):
+            raise ValueError("People's names must be unique")
+
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            raise ValueError("'items' must be a non-empty list")
+        prices, assignees = [], []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError(f"Item {i + 1} must be an object")
+            price = api_amount(item, 'price')
+            if price <= 0:
+                raise ValueError(f"Item {i + 1} must have a positive price")
+            assigned_to = item.get('assigned_to')
+            if not isinstance(assigned_to, list) or not all(isinstance(name, str) for name in assigned_to):
+                raise ValueError(f"Item {i + 1} needs an 'assigned_to' list of names")
+            prices.append(price)
+            assignees.append(assigned_to)
+
+        subtotal = api_amount(data, 'subtotal')
+        tax = api_amount(data, 'tax', 0)
+        tip = api_amount(data, 'tip', 0)
+        total = api_amount(data, 'total')
+        check_totals(prices, subtotal, tax, tip, total)
+
+        split = split_receipt(prices, assignees, people, tax=tax, tip=tip)
+    except TotalsMismatchError as e:
+        return jsonify({"error": str(e)}), 422
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    breakdown = split.breakdown()
+    return jsonify({
+        "shares": [dict(person=person, **breakdown[person]) for person in split.people],
+        "subtotal": round_decimal(subtotal),
+        "tax": round_decimal(tax),
+        "tip": round_decimal(tip),
+        "total": round_decimal(total)
+    })
+
 @app.route("/safety", methods=["GET", "POST"])
 def safety():
     # Get session data
@@ -102,6 +473,7 @@ def safety():
             'tip': 0.00,
             'total': 0.00
         }
+        session.pop('live_split', None)
         parsed_data = session['parsed_data']
     else:
         parsed_data = session_data['parsed_data']
@@ -128,6 +500,7 @@ def safety():
             # Update items
             edited_items = []
             calculated_subtotal = Decimal('0')
+            item_prices = []
             
             # Process each item
             for key in item_keys:
@@ -160,6 +533,7 @@ def safety():
                     
                     # Add to subtotal
                     calculated_subtotal += price
+                    item_prices.append(price)
                         
                 except (ValueError, KeyError, TypeError) as e:
                     logger.error(f"Error processing item {key}: {str(e)}")
@@ -187,15 +561,11 @@ def safety():
                 logger.info(f"Individual items: {[(item['name'], item['price']) for item in edited_items]}")
                 
                 # Validate totals with exact decimal comparison
-                if calculated_subtotal != submitted_subtotal:
-                    flash("Subtotal doesn't match item prices")
-                    return render_template("safety.html", parsed_data=parsed_data)
-                
-                calculated_total = round_decimal(submitted_subtotal + tax + tip)
-                if calculated_total != total:
-                    flash("Total doesn't match subtotal + tax + tip")
-                    return render_template("safety.html", parsed_data=parsed_data)
+                check_totals(item_prices, submitted_subtotal, tax, tip, total)
                 
+            except TotalsMismatchError as e:
+                flash(str(e))
+                return render_template("safety.html", parsed_data=parsed_data)
             except ValueError as e:
                 logger.error(f"Value error in totals: {str(e)}")
                 flash("Please enter valid numbers for totals")
@@ -210,6 +580,8 @@ def safety():
                 "total": float(total)
             })
             session["parsed_data"] = parsed_data
+            # Items or people changed: the running split starts over
+            session.pop("live_split", None)
             session.modified = True
             
             return redirect(url_for('assign_items'))
@@ -225,52 +597,33 @@ def safety():
 def assign_items():
     # Ensure we have session data
     session_data = get_session_data()
-    if not session_data:
+    if not session_data or not session_data['parsed_data']:
         flash('Please enter receipt details first.', 'warning')
         return redirect(url_for('safety'))
+    if not session_data['people_names']:
+        flash('Please enter the names of the people splitting the check.', 'warning')
+        return redirect(url_for('safety'))
 
     if request.method == 'POST':
         try:
-            # Get item assignments
+            # Get item assignments; the running split only redoes items whose
+            # assignment differs from what the page already sent
+            live = load_live_split(session_data)
             item_assignments = {}
             for i, item in enumerate(session_data['parsed_data']['items']):
                 assigned_to = request.form.getlist(f'item_{i}[]')
                 if not assigned_to:
                     flash('Please assign all items to at least one person.', 'warning')
                     return redirect(url_for('assign_items'))
+                live.assign(i, assigned_to)
                 item_assignments[item['name']] = assigned_to
 
-            # Calculate individual costs
-            individual_costs = defaultdict(Decimal)
-            tax_rate = Decimal(session_data['parsed_data']['tax']) / Decimal(session_data['parsed_data']['subtotal'])
-            tip_rate = Decimal(session_data['parsed_data']['tip']) / Decimal(session_data['parsed_data']['subtotal'])
-
-            # Calculate base costs
-            for item in session_data['parsed_data']['items']:
-                item_price = Decimal(str(item['price']))
-                assigned_to = item_assignments[item['name']]
-                price_per_person = item_price / Decimal(len(assigned_to))
-                
-                # Add base price
-                for person in assigned_to:
-                    individual_costs[person] += round_decimal(price_per_person)
-
-                # Add tax and tip for this item
-                item_tax = round_decimal(item_price * tax_rate)
-                item_tip = round_decimal(item_price * tip_rate)
-                tax_per_person = item_tax / Decimal(len(assigned_to))
-                tip_per_person = item_tip / Decimal(len(assigned_to))
-                
-                for person in assigned_to:
-                    individual_costs[person] += round_decimal(tax_per_person)
-                    individual_costs[person] += round_decimal(tip_per_person)
-
-            # Round final amounts
-            for person in individual_costs:
-                individual_costs[person] = round_decimal(individual_costs[person])
+            # Items, tax and tip split in exact cents
+            individual_costs = live.split().totals()
 
             # Store results in session
-            session['individual_costs'] = {k: str(v) for k, v in individual_costs.items()}
+            save_live_split(live, session_data['parsed_data'])
+            session['individual_costs'] = individual_costs
             session['item_assignments'] = item_assignments
 
             return redirect(url_for('results'))
@@ -280,12 +633,45 @@ def assign_items():
             flash('An error occurred while processing item assignments. Please try again.', 'danger')
             return redirect(url_for('assign_items'))
 
+    live = load_live_split(session_data)
+    if 'live_split' not in session:
+        save_live_split(live, session_data['parsed_data'])
     return render_template(
         'assign_items.html',
         people_names=session_data['people_names'],
-        parsed_data=session_data['parsed_data']
+        parsed_data=session_data['parsed_data'],
+        assignments=live.assignments(),
+        shares=live.breakdown(),
+        unassigned=from_cents(live.unassigned_cents)
     )
 
+@app.route('/assign_items/<int:index>', methods=['POST'])
+def assign_item(index):
+    """Reassign one item and return only the shares that changed, for the assign page's live totals.
+
+    Takes ``{"assigned_to": [names]}``; an empty list unassigns the item.
+    """
+    session_data = get_session_data()
+    if not session_data or not session_data['parsed_data'] or not session_data['people_names']:
+        return jsonify({"error": "Please enter receipt details first"}), 409
+    names = (request.get_json(silent=True) or {}).get('assigned_to')
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return jsonify({"error": "'assigned_to' must be a list of names"}), 400
+
+    live = load_live_split(session_data)
+    try:
+        changed = live.assign(index, names)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    save_live_split(live, session_data['parsed_data'])
+    return jsonify({
+        "item": index,
+        "assigned_to": live.item_assignees(index),
+        "changed": live.breakdown(changed),
+        "unassigned": from_cents(live.unassigned_cents),
+        "complete": live.complete
+    })
+
 @app.route('/results')
 def results():
     # Ensure we have all required session data
@@ -308,21 +694,97 @@ def results():
         item_assignments=item_assignments
     )
 
+@app.route('/sessions/stats')
+def session_stats():
+    """Session store size and (de)serialization cost."""
+    if session_interface is None:
+        return jsonify({'backend': 'cookie'})
+    return jsonify(session_interface.stats())
+
+def split_snapshot(session_data):
+    """The finished split in the session as plain data for sharing, or None until every item is assigned."""
+    parsed_data = session_data['parsed_data']
+    if not parsed_data or not parsed_data['items'] or not session_data['people_names']:
+        return None
+    live = load_live_split(session_data)
+    if not live.complete:
+        return None
+    breakdown = live.breakdown()
+    items = []
+    for item, assigned_to in zip(parsed_data['items'], live.assignments()):
+        price = round_decimal(Decimal(str(item['price'])))
+        items.append({
+            'name': item['name'],
+            'price': str(price),
+            'assigned_to': assigned_to,
+            'each': str(round_decimal(price / len(assigned_to)))
+        })
+    return {
+        'restaurant': parsed_data.get('restaurant_name') or '',
+        'items': items,
+        'people': [
+            {'name': person, **{key: str(amount) for key, amount in breakdown[person].items()}}
+            for person in live.people
+        ],
+        **{key: str(round_decimal(Decimal(str(parsed_data[key])))) for key in ('subtotal', 'tax', 'tip', 'total')}
+    }
+
+def render_shared_split(snapshot):
+    return render_template('shared.html', split=snapshot)
+
+# Immutable snapshots of finished splits, served pre-rendered from /s/<id>
+shared_splits = create_shared_splits(render_shared_split)
+REGISTRY.register_stats('shares', shared_splits.stats)
+
 @app.route("/share", methods=["POST"])
 def share():
+    """Publish the finished split and return (or redirect to) its link; sharing it again gives the same link."""
+    session_data = get_session_data()
+    snapshot = split_snapshot(session_data) if session_data else None
+    if snapshot is None:
+        if wants_json():
+            return jsonify({"error": "Please assign every item before sharing"}), 409
+        flash('Please assign items to people first.', 'warning')
+        return redirect(url_for('assign_items'))
+
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-            
-        # Here you would implement your sharing logic
-        # For example, generating a shareable link or sending an email
-        
-        return jsonify({"message": "Share functionality implemented here"})
-        
+        share_id = shared_splits.publish(snapshot)
     except Exception as e:
         logger.error(f"Error in share: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        if wants_json():
+            return jsonify({"error": "Could not save the shared split"}), 500
+        flash('Could not create a share link. Please try again.', 'danger')
+        return redirect(url_for('results'))
+
+    url = url_for('shared_split', share_id=share_id, _external=True)
+    if wants_json():
+        return jsonify({"id": share_id, "url": url}), 201
+    return redirect(url)
+
+@app.route(SHARE_PREFIX + '<share_id>')
+def shared_split(share_id):
+    """A shared split's page, straight from the cache: no session, no re-rendering, 304 for repeat views."""
+    page = shared_splits.page(share_id)
+    if page is None:
+        return Response('This shared split does not exist.', status=404, mimetype='text/plain')
+
+    # Each encoding is its own representation with its own ETag; tags come
+    # back weakened (W/"...") from compressing proxies and CDNs, so compare weakly
+    gzipped = bool(request.accept_encodings['gzip'])
+    etag = f'{page.etag}.gz' if gzipped else page.etag
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif gzipped:
+        response = Response(page.gzipped, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(page.gzipped), mimetype='text/html')
+    response.set_etag(etag)
+    # Snapshots never change; revalidating after SHARE_MAX_AGE costs a 304 and
+    # picks up a re-rendered page (new ETag) after a template change
+    response.headers['Cache-Control'] = f'public, max-age={SHARE_MAX_AGE}'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route("/manual_entry")
 def manual_entry():
@@ -334,6 +796,7 @@ def manual_entry():
         'tip': 0.00,
         'total': 0.00
     }
+    session.pop('live_split', None)
     return redirect(url_for('safety'))
 
 if __name__ == '__main__':
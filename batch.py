@@ -0,0 +1,224 @@
+"""Batch receipt parsing on a pool of OCR worker processes.
+
+    python batch.py receipts/ more/*.jpg --workers 4 > results.ndjson
+
+Each receipt is written as one JSON line as soon as it finishes, followed
+by a summary line with throughput and mean per-stage timings.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+import multiprocessing
+from collections import defaultdict
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from algorithm import ImageSource
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.pdf', '.html', '.htm', '.txt'}
+
+# Pools are kept between batches so their workers keep the OCR models
+# loaded, and shut down once no batch has used them for this long (each
+# worker holds its own copy of the models)
+POOL_IDLE_SECONDS = float(os.getenv('BATCH_POOL_IDLE_SECONDS', 300))
+
+@dataclass
+class _Pool:
+    executor: ProcessPoolExecutor
+    active: int = 0
+    idle_timer: Optional[threading.Timer] = None
+
+_pools: Dict[int, _Pool] = {}
+_pools_lock = threading.Lock()
+
+def _acquire_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn, not fork: the parent may already have torch or OCR threads running
+            pool = _pools[workers] = _Pool(ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_up_worker
+            ))
+        if pool.idle_timer is not None:
+            pool.idle_timer.cancel()
+            pool.idle_timer = None
+        pool.active += 1
+        return pool.executor
+
+def _release_pool(workers: int, executor: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None or pool.executor is not executor:
+            return
+        pool.active -= 1
+        if pool.active == 0 and POOL_IDLE_SECONDS > 0:
+            pool.idle_timer = threading.Timer(POOL_IDLE_SECONDS, _shut_down_if_idle, (workers, executor))
+            pool.idle_timer.daemon = True
+            pool.idle_timer.start()
+
+def _shut_down_if_idle(workers: int, executor: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None or pool.executor is not executor or pool.active:
+            return
+        del _pools[workers]
+    logger.info(f"Shutting down the idle {workers}-worker batch pool")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _discard_pool(workers: int, executor: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None or pool.executor is not executor:
+            return
+        del _pools[workers]
+        if pool.idle_timer is not None:
+            pool.idle_timer.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _warm_up_worker() -> None:
+    # The OCR stack is only imported in the worker processes, never by the
+    # web process that hands them receipts
+    from algorithm import warm_up_ocr
+    warm_up_ocr()
+
+def _parse_one(index: int, name: str, source) -> Dict:
+    """Worker-side body: parse one receipt and report how long each stage took."""
+    from algorithm import parse_receipt_image
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    record = {'index': index, 'name': name}
+    try:
+        record['result'] = parse_receipt_image(source, timings=timings)
+        record['ok'] = True
+    except Exception as e:
+        record['ok'] = False
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    record['timings'] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    return record
+
+def parse_receipt_images(sources: Iterable["ImageSource"], workers: Optional[int] = None,
+                         names: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Parse many receipts across worker processes, yielding records as they complete.
+
+    Sources are paths or encoded image bytes (anything else is read into
+    bytes first). Records come back in completion order with the input
+    ``index``, ``ok``, ``result`` or ``error``, and per-stage ``timings``.
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = _acquire_pool(workers)
+    inputs = enumerate(sources)
+    pending = set()
+
+    def submit_next() -> None:
+        for index, source in inputs:
+            if not isinstance(source, (str, bytes)):
+                from algorithm import open_image_buffer
+                with open_image_buffer(source) as buffer:
+                    source = bytes(buffer)
+            name = names[index] if names else (source if isinstance(source, str) else f"#{index}")
+            pending.add(pool.submit(_parse_one, index, name, source))
+            return
+
+    try:
+        # Keep two receipts per worker in flight so large batches aren't all in memory
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield future.result()
+                submit_next()
+    except BrokenProcessPool:
+        _discard_pool(workers, pool)
+        raise
+    finally:
+        # Closed early (e.g. the client of a streamed response went away):
+        # drop the receipts that haven't started; running ones finish
+        for future in pending:
+            future.cancel()
+        _release_pool(workers, pool)
+
+class BatchReport:
+    """Throughput and mean stage timings over a stream of batch records."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.receipts = 0
+        self.failed = 0
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+
+    def add(self, record: Dict) -> None:
+        self.receipts += 1
+        if not record['ok']:
+            self.failed += 1
+        for stage, seconds in record['timings'].items():
+            self.stage_seconds[stage] += seconds
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'receipts': self.receipts,
+            'failed': self.failed,
+            'elapsed_seconds': round(elapsed, 3),
+            'receipts_per_second': round(self.receipts / elapsed, 3) if elapsed else 0.0,
+            'mean_stage_seconds': {
+                stage: round(seconds / self.receipts, 4) for stage, seconds in self.stage_seconds.items()
+            }
+        }
+
+def _collect_paths(paths: List[str]) -> List[str]:
+    collected = []
+    for path in paths:
+        if os.path.isdir(path):
+            collected.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if os.path.splitext(name)[1].lower() in RECEIPT_EXTENSIONS
+            )
+        else:
+            collected.append(path)
+    return collected
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Parse receipt images in bulk and write NDJSON results.')
+    parser.add_argument('paths', nargs='+', help='receipt images or directories of them')
+    parser.add_argument('--workers', type=int, default=None, help='OCR worker processes (default: CPU count)')
+    parser.add_argument('--output', '-o', default='-', help='NDJSON output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    paths = _collect_paths(args.paths)
+    if not paths:
+        parser.error('no receipt images found')
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    report = BatchReport()
+    try:
+        for record in parse_receipt_images(paths, workers=args.workers):
+            report.add(record)
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+        summary = report.summary()
+        output.write(json.dumps({'summary': summary}) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"{summary['receipts']} receipts ({summary['failed']} failed) in "
+          f"{summary['elapsed_seconds']}s: {summary['receipts_per_second']} receipts/sec", file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""Speed and accuracy of parse_receipt_image over a receipt corpus.
+
+The corpus is uploads/ (or the given directories) plus synthetic
+receipts rendered with PIL at several resolutions and noise levels.
+Ground truth for an image ``name.png`` is read from ``name.json`` next
+to it or from benchmarks/ground_truth/; images without one are timed
+but not scored.
+
+For each worker count it reports throughput, per-stage wall time, peak
+worker RSS and item/tax/total accuracy, and writes everything to a JSON
+report. Pass an earlier report as --baseline to flag regressions (the
+exit status is 1 when there are any).
+
+    python benchmarks/corpus_benchmark.py --workers 1 4 --report after.json --baseline before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import difflib
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GROUND_TRUTH_DIR = os.path.join(ROOT, 'benchmarks', 'ground_truth')
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+
+# Synthetic variants: (receipt width in pixels, noise sigma, rotation in degrees)
+SYNTHETIC_VARIANTS = [(400, 0, 0), (800, 0, 0), (1600, 0, 0), (800, 12, 0), (800, 25, 1.5), (1600, 12, 3)]
+MENU = ['Chicken Burger', 'Large Drink', 'French Fries', 'Caesar Salad', 'Iced Tea', 'Grill Octopus',
+        'Salmon Tartar', 'Margherita Pizza', 'Fish Tacos', 'Club Sandwich', 'Onion Rings', 'Lemonade']
+
+# Relative changes that count as regressions against a baseline
+SLOWER = 0.10
+LESS_ACCURATE = 0.01
+
+def cents(value) -> Decimal:
+    return Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def render_receipt(seed, width, noise, angle):
+    """PNG bytes and ground truth for a synthetic receipt."""
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed)
+    font_size = max(12, width // 26)
+    try:
+        font = ImageFont.truetype('DejaVuSans.ttf', font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    items = []
+    for name in rng.sample(MENU, rng.randint(3, 8)):
+        quantity = 2 if rng.random() < 0.2 else 1
+        items.append({'name': name, 'quantity': quantity, 'price': str(cents(rng.uniform(3, 40) * quantity))})
+    subtotal = sum(Decimal(item['price']) for item in items)
+    tax = cents(subtotal * Decimal('0.07'))
+    total = subtotal + tax
+
+    lines = ['Harbor Restaurant', '']
+    lines += [f"{item['quantity']} {item['name']}" if item['quantity'] > 1 else item['name'] for item in items]
+    lines += ['', 'Subtotal', 'Tax', 'Total']
+    prices = [None, None] + [item['price'] for item in items] + [None, str(subtotal), str(tax), str(total)]
+    line_height = int(font_size * 1.6)
+    margin = font_size * 2
+    page = Image.new('L', (width, margin * 2 + line_height * len(lines)), 255)
+    draw = ImageDraw.Draw(page)
+    for i, (text, price) in enumerate(zip(lines, prices)):
+        y = margin + i * line_height
+        draw.text((margin, y), text, fill=0, font=font)
+        if price is not None:
+            label = f"${price}"
+            draw.text((width - margin - draw.textlength(label, font=font), y), label, fill=0, font=font)
+    if angle:
+        page = page.rotate(angle, expand=True, fillcolor=255)
+    pixels = np.asarray(page, dtype=np.float32)
+    if noise:
+        pixels = pixels + np.random.default_rng(seed).normal(0, noise, pixels.shape)
+    _, encoded = cv2.imencode('.png', np.clip(pixels, 0, 255).astype(np.uint8))
+    truth = {'restaurant_name': 'Harbor Restaurant', 'items': items,
+             'subtotal': str(subtotal), 'tax': str(tax), 'total': str(total)}
+    return encoded.tobytes(), truth
+
+def load_corpus(directories, synthetic, workdir):
+    """(name, path, truth or None) for every corpus image, rendering synthetic ones into workdir."""
+    corpus = []
+    for directory in directories:
+        for name in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            truth = None
+            for truth_path in (os.path.join(directory, stem + '.json'), os.path.join(GROUND_TRUTH_DIR, stem + '.json')):
+                if os.path.exists(truth_path):
+                    with open(truth_path) as f:
+                        truth = json.load(f)
+                    break
+            corpus.append((name, os.path.join(directory, name), truth))
+    for seed in range(synthetic):
+        width, noise, angle = SYNTHETIC_VARIANTS[seed % len(SYNTHETIC_VARIANTS)]
+        data, truth = render_receipt(seed, width, noise, angle)
+        name = f"synthetic-{seed:03d}-w{width}-n{noise}-r{angle}.png"
+        path = os.path.join(workdir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        corpus.append((name, path, truth))
+    return corpus
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def _bench_one(name, path):
+    """Worker-side: parse one receipt, returning its result, stage timings and peak RSS."""
+    from algorithm import parse_receipt_image
+    timings = {}
+    start = time.perf_counter()
+    record = {'name': name}
+    try:
+        record['result'] = parse_receipt_image(path, timings=timings)
+    except Exception as e:
+        record['error'] = str(e)
+    record['seconds'] = time.perf_counter() - start
+    record['timings'] = timings
+    record['peak_rss_mb'] = _peak_rss_mb()
+    return record
+
+def _warm_worker():
+    from algorithm import warm_up_ocr
+    warm_up_ocr()
+
+def expand_items(items):
+    """Ground-truth lines as the parser reports them: one item per unit, price split evenly."""
+    expanded = []
+    for item in items:
+        quantity = int(item.get('quantity', 1))
+        price = cents(Decimal(str(item['price'])) / quantity)
+        for i in range(quantity):
+            expanded.append((f"{item['name']} {i + 1}" if quantity > 1 else item['name'], price))
+    return expanded
+
+def score(result, truth):
+    """Matched items (same price, similar name) and whether tax/total/restaurant are right."""
+    expected = expand_items(truth['items'])
+    found = [(item['name'], cents(item['price'])) for item in (result or {}).get('items', [])]
+    unmatched = list(found)
+    matched = 0
+    for name, price in expected:
+        candidates = [(difflib.SequenceMatcher(None, name.lower(), other.lower()).ratio(), i)
+                      for i, (other, other_price) in enumerate(unmatched) if other_price == price]
+        best = max(candidates, default=(0, None))
+        if best[0] >= 0.6:
+            matched += 1
+            unmatched.pop(best[1])
+    return {
+        'expected_items': len(expected),
+        'found_items': len(found),
+        'matched_items': matched,
+        'total_ok': result is not None and cents(result['total']) == cents(truth['total']),
+        'tax_ok': result is not None and cents(result['tax']) == cents(truth['tax']),
+        'restaurant_ok': result is not None and
+                         result.get('restaurant_name', '').lower() == truth.get('restaurant_name', '').lower()
+    }
+
+def run_corpus(corpus, workers):
+    """Parse the corpus on a fresh pool of ``workers`` processes (models loaded before timing)."""
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_warm_worker)
+    try:
+        # Occupy every worker once so model loading isn't timed
+        list(pool.map(time.sleep, [0.5] * workers))
+        start = time.perf_counter()
+        records = list(pool.map(_bench_one, [name for name, _, _ in corpus], [path for _, path, _ in corpus]))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+    return records, elapsed
+
+def summarize(corpus, records, elapsed, workers):
+    stage_seconds = defaultdict(list)
+    totals = defaultdict(int)
+    receipts = []
+    for (name, _, truth), record in zip(corpus, records):
+        for stage, seconds in record['timings'].items():
+            stage_seconds[stage].append(seconds)
+        entry = {'name': name, 'ok': 'error' not in record, 'seconds': round(record['seconds'], 4)}
+        if 'error' in record:
+            entry['error'] = record['error']
+        if truth is not None:
+            entry['score'] = score(record.get('result'), truth)
+            totals['scored'] += 1
+            for key in ('expected_items', 'found_items', 'matched_items'):
+                totals[key] += entry['score'][key]
+            for key in ('total_ok', 'tax_ok', 'restaurant_ok'):
+                totals[key] += int(entry['score'][key])
+        receipts.append(entry)
+
+    def ratio(numerator, denominator):
+        return round(numerator / denominator, 4) if denominator else None
+
+    return {
+        'workers': workers,
+        'receipts': len(records),
+        'failed': sum(1 for record in records if 'error' in record),
+        'elapsed_seconds': round(elapsed, 3),
+        'receipts_per_second': round(len(records) / elapsed, 3) if elapsed else 0.0,
+        'peak_rss_mb': round(max(record['peak_rss_mb'] for record in records), 1),
+        'stages': {
+            stage: {
+                'mean': round(sum(values) / len(values), 4),
+                'p50': round(sorted(values)[len(values) // 2], 4),
+                'p95': round(sorted(values)[min(len(values) - 1, int(0.95 * len(values)))], 4)
+            }
+            for stage, values in stage_seconds.items()
+        },
+        'accuracy': {
+            'scored_receipts': totals['scored'],
+            'item_precision': ratio(totals['matched_items'], totals['found_items']),
+            'item_recall': ratio(totals['matched_items'], totals['expected_items']),
+            'total_accuracy': ratio(totals['total_ok'], totals['scored']),
+            'tax_accuracy': ratio(totals['tax_ok'], totals['scored']),
+            'restaurant_accuracy': ratio(totals['restaurant_ok'], totals['scored'])
+        },
+        'receipts_detail': receipts
+    }
+
+def regressions(report, baseline):
+    """Human-readable regressions of ``report`` against ``baseline``, matched by worker count."""
+    found = []
+    previous = {run['workers']: run for run in baseline.get('runs', [])}
+    for run in report['runs']:
+        before = previous.get(run['workers'])
+        if before is None:
+            continue
+        label = f"workers={run['workers']}"
+        if run['receipts_per_second'] < before['receipts_per_second'] * (1 - SLOWER):
+            found.append(f"{label}: throughput {before['receipts_per_second']} -> {run['receipts_per_second']} receipts/s")
+        if run['peak_rss_mb'] > before['peak_rss_mb'] * (1 + SLOWER):
+            found.append(f"{label}: peak RSS {before['peak_rss_mb']} -> {run['peak_rss_mb']} MB")
+        for stage, stats in run['stages'].items():
+            old = before['stages'].get(stage)
+            # Ignore sub-millisecond stages: their noise dwarfs any real change
+            if old and stats['mean'] > old['mean'] * (1 + SLOWER) and stats['mean'] - old['mean'] > 0.001:
+                found.append(f"{label}: stage {stage} mean {old['mean']}s -> {stats['mean']}s")
+        for metric, value in run['accuracy'].items():
+            old = before['accuracy'].get(metric)
+            if metric != 'scored_receipts' and value is not None and old is not None and value < old - LESS_ACCURATE:
+                found.append(f"{label}: {metric} {old} -> {value}")
+    return found
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('corpus', nargs='*', help='directories of receipt images (default: uploads/)')
+    parser.add_argument('--synthetic', type=int, default=12, help='synthetic receipts to render (default: 12)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='worker counts to measure')
+    parser.add_argument('--report', default='benchmark-report.json', help='where to write the JSON report')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    args = parser.parse_args()
+
+    # Every receipt must go through the pipeline, not the result cache
+    os.environ['RECEIPT_CACHE_SIZE'] = '0'
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = load_corpus(args.corpus or [os.path.join(ROOT, 'uploads')], args.synthetic, workdir)
+        if not corpus:
+            parser.error('the corpus is empty')
+        runs = []
+        for workers in args.workers:
+            records, elapsed = run_corpus(corpus, workers)
+            runs.append(summarize(corpus, records, elapsed, workers))
+
+    from algorithm import ReceiptParser
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_revision': git_revision(),
+        'config_version': ReceiptParser().config_version(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'corpus_size': len(corpus),
+        'runs': runs
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for run in runs:
+        accuracy = run['accuracy']
+        print(f"workers={run['workers']}: {run['receipts']} receipts ({run['failed']} failed) in "
+              f"{run['elapsed_seconds']}s, {run['receipts_per_second']} receipts/s, peak RSS {run['peak_rss_mb']} MB")
+        print(f"  items precision {accuracy['item_precision']} recall {accuracy['item_recall']}, "
+              f"totals {accuracy['total_accuracy']}, tax {accuracy['tax_accuracy']} "
+              f"over {accuracy['scored_receipts']} scored receipts")
+        for stage, stats in run['stages'].items():
+            print(f"  {stage:<13} mean {stats['mean'] * 1000:8.1f} ms   p95 {stats['p95'] * 1000:8.1f} ms")
+    print(f"report written to {args.report}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f))
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            return 1
+        print('no regressions against the baseline')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Before/after benchmark for receipt cropping, deskew and text-height resampling.
+
+Runs preprocess_image with the geometry stage disabled and with the
+configured PreprocessConfig, reporting the pixels handed to OCR and the
+preprocessing time. With --ocr it also runs the OCR engines and counts
+lines the price regex matches. Besides the images in uploads/, a
+synthetic 12 MP photo of a rotated receipt on a table is included.
+
+    python benchmarks/geometry_benchmark.py [--ocr] [--repeat N] [images ...]
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from algorithm import ReceiptParser, PreprocessConfig  # noqa: E402
+
+PRICE_LINE = re.compile(r'\$?\s*\d+\.\d{2}')
+
+def synthetic_photo(width=4000, height=3000, angle=6.0):
+    """PNG bytes of a receipt photographed at an angle on a dark table."""
+    try:
+        font = ImageFont.truetype('DejaVuSans.ttf', 44)
+    except OSError:
+        font = ImageFont.load_default()
+    paper = Image.new('L', (1000, 2400), 240)
+    draw = ImageDraw.Draw(paper)
+    draw.text((80, 60), 'SAMPLE RESTAURANT', fill=20, font=font)
+    for i in range(1, 40):
+        draw.text((80, 60 + i * 55), f'{i % 3 + 1} Menu item {i}', fill=25, font=font)
+        draw.text((720, 60 + i * 55), f'${i * 1.37 + 2:.2f}', fill=25, font=font)
+    rotated = paper.rotate(angle, expand=True, fillcolor=0)
+    mask = Image.new('L', paper.size, 255).rotate(angle, expand=True, fillcolor=0)
+    photo = Image.new('L', (width, height), 70)
+    photo.paste(rotated, ((width - rotated.width) // 2, (height - rotated.height) // 2), mask)
+    noise = np.random.default_rng(0).normal(0, 6, (height, width))
+    pixels = np.clip(np.asarray(photo, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    _, encoded = cv2.imencode('.png', pixels)
+    return encoded.tobytes()
+
+def measure(parser, data, repeat, ocr):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        processed = parser.preprocess_image(data)
+    result = {
+        'pixels': processed.size,
+        'preprocess_ms': 1000 * (time.perf_counter() - start) / repeat
+    }
+    if ocr:
+        start = time.perf_counter()
+        lines = parser.run_ocr(processed)
+        result['ocr_ms'] = 1000 * (time.perf_counter() - start)
+        result['price_lines'] = sum(1 for line in lines if PRICE_LINE.search(line.text))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('images', nargs='*', help='receipt images (default: uploads/*)')
+    parser.add_argument('--repeat', type=int, default=3, help='preprocessing runs per image')
+    parser.add_argument('--ocr', action='store_true', help='also run OCR and count price lines')
+    args = parser.parse_args()
+
+    inputs = [(os.path.basename(path), open(path, 'rb').read())
+              for path in (args.images or sorted(glob.glob(os.path.join(ROOT, 'uploads', '*'))))]
+    inputs.append(('synthetic-12mp', synthetic_photo()))
+
+    variants = {
+        'before': ReceiptParser(preprocess_config=PreprocessConfig(
+            crop_receipt=False, deskew=False, target_text_height=0, max_long_edge=0)),
+        'after': ReceiptParser(preprocess_config=PreprocessConfig.from_env())
+    }
+    for name, data in inputs:
+        print(name)
+        for label, receipt_parser in variants.items():
+            result = measure(receipt_parser, data, args.repeat, args.ocr)
+            line = f"  {label:<7} {result['pixels'] / 1e6:6.2f} MP  preprocess {result['preprocess_ms']:8.1f} ms"
+            if args.ocr:
+                line += f"  ocr {result['ocr_ms']:8.1f} ms  price lines {result['price_lines']}"
+            print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Micro-benchmark for receipt line cleaning and parsing.
+
+Times ReceiptParser's compiled single-pass line classifier against the
+previous multi-scan implementation (kept below for reference) on
+synthetic OCR dumps, and checks both produce the same receipt. Also
+times the column-aware path: the same dump laid out as OCR words with
+right-aligned prices, parsed through build_layout and parse_receipt.
+
+    python benchmarks/parse_benchmark.py [--lines 10000] [--repeat 5]
+"""
+import os
+import re
+import sys
+import time
+import random
+import logging
+import argparse
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from algorithm import ReceiptParser, ReceiptItem, round_decimal  # noqa: E402
+from receipt_layout import OCRLine, OCRWord, build_layout  # noqa: E402
+
+ITEM_NAMES = ['Grill Octopus', 'Salmon Tartar', 'Oysters - Green NZ', 'Grey Goose Lime',
+              'Chicken Burger', 'Large Drink', 'French Fries', 'Caesar Salad', 'Iced Tea']
+NOISE = ['Order : 63', 'Check : 598', 'VISA 4443 Sale', 'Host: Dana', 'Authorization Approved',
+         'Like us on Facebook', 'Email: hello@example.com', 'Table 12', 'Guest 4', 'Customer Copy',
+         '03/20/2020 12:18 PM', 'Thank you!', '']
+
+def synthetic_dump(lines, seed=0):
+    """Raw OCR-style lines: items, totals, headers, noise and OCR garbage."""
+    rng = random.Random(seed)
+    dump = []
+    for _ in range(lines):
+        roll = rng.random()
+        price = f"{rng.randint(1, 60)}{rng.choice('.,')}{rng.randint(0, 99):02d}"
+        if roll < 0.45:
+            quantity = f"{rng.randint(1, 3)} " if rng.random() < 0.4 else ''
+            dump.append(f"{quantity}{rng.choice(ITEM_NAMES)}  ${price}")
+        elif roll < 0.5:
+            dump.append(f"{rng.choice(['Tax', 'Subtotal', 'Total', 'Balance Due'])}: ${price}")
+        elif roll < 0.52:
+            dump.append('Waterview Restaurant')
+        elif roll < 0.8:
+            dump.append(rng.choice(NOISE))
+        else:
+            dump.append(''.join(rng.choice('abcXYZ019 .,$%#@!*') for _ in range(rng.randint(3, 30))))
+    return dump
+
+def synthetic_layout(dump, char_width=12, line_height=30, price_right=640):
+    """The dump as OCR lines: words left to right, a trailing amount right-aligned."""
+    lines = []
+    for row, text in enumerate(dump):
+        top = row * line_height
+        words, x = [], 10
+        tokens = text.split()
+        for i, token in enumerate(tokens):
+            width = len(token) * char_width
+            left = price_right - width if i == len(tokens) - 1 and '$' in token else x
+            words.append(OCRWord(token, 0.9, left, top, left + width, top + line_height - 8))
+            x += width + char_width
+        if words:
+            lines.append(OCRLine(text, 0.9, top, top + line_height - 8, words[0].left, 'tesseract', words))
+    return lines
+
+# --- previous implementation, for comparison -------------------------------
+
+def legacy_clean_line(line):
+    line = re.sub(r'[^\w\s.$%-]', '', line)
+    line = ' '.join(line.split())
+    line = re.sub(r'(\d+)[\.,](\d{2})', r'\1.\2', line)
+    return line.strip()
+
+def legacy_is_skip_line(parser, line):
+    lower_line = line.lower()
+    return any(indicator in lower_line for indicator in parser.patterns['skip_indicators'])
+
+def legacy_parse_lines(text_lines):
+    """The old parse_receipt's restaurant/item/tax/total passes."""
+    logger = logging.getLogger('legacy')
+    items = []
+    tax = total = Decimal('0')
+    restaurant_name = ""
+    for line in text_lines:
+        if 'RESTAURANT' in line.upper():
+            restaurant_name = line.strip()
+            break
+    for line in text_lines:
+        line = line.strip()
+        if not line:
+            continue
+        logger.info(f"Processing line: {line}")
+        if any(skip in line.upper() for skip in ['ORDER:', 'HOST:', 'VISA', 'AUTHORIZE', 'LIKE', 'FACEBOOK', 'EMAIL']):
+            continue
+        price_match = re.search(r'\$(\d+\.\d{2})', line)
+        if not price_match:
+            continue
+        price = Decimal(price_match.group(1))
+        line_lower = line.lower()
+        if 'subtotal' in line_lower:
+            continue
+        if 'tax' in line_lower:
+            tax = price
+            continue
+        if any(total_word in line_lower for total_word in ['total', 'balance due']) and 'subtotal' not in line_lower:
+            total = price
+            continue
+        quantity = 1
+        quantity_match = re.match(r'^\s*(\d+)\s+', line)
+        if quantity_match:
+            quantity = int(quantity_match.group(1))
+            line = re.sub(r'^\s*\d+\s+', '', line)
+        name = line.split('$')[0].strip()
+        if len(name) > 2 and not any(skip in name.upper() for skip in ['SUBTOTAL', 'TAX', 'TOTAL', 'BALANCE']):
+            price_per_item = round_decimal(price / Decimal(quantity))
+            for i in range(quantity):
+                item_name = f"{name} {i + 1}" if quantity > 1 else name
+                items.append(ReceiptItem(name=item_name, price=price_per_item, quantity=1))
+    return restaurant_name, items, tax, total
+
+# ---------------------------------------------------------------------------
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=10000, help='lines per synthetic dump')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    receipt_parser = ReceiptParser()
+    dump = synthetic_dump(args.lines)
+
+    def clean_new(lines):
+        cleaned = (receipt_parser.clean_line(line) for line in lines)
+        return [line for line in cleaned if line and not receipt_parser.is_skip_line(line)]
+
+    def clean_old(lines):
+        cleaned = (legacy_clean_line(line) for line in lines)
+        return [line for line in cleaned if line and not legacy_is_skip_line(receipt_parser, line)]
+
+    old_clean_time, old_cleaned = best_of(args.repeat, clean_old, dump)
+    new_clean_time, new_cleaned = best_of(args.repeat, clean_new, dump)
+    assert old_cleaned == new_cleaned, 'cleaned lines differ'
+
+    old_parse_time, (name, items, tax, total) = best_of(args.repeat, legacy_parse_lines, new_cleaned)
+    new_parse_time, receipt = best_of(args.repeat, receipt_parser.parse_receipt, new_cleaned)
+    assert (receipt.restaurant_name, receipt.items, receipt.tax, receipt.total) == (name, items, tax, total), \
+        'parsed receipts differ'
+
+    ocr_lines = synthetic_layout(dump)
+
+    def parse_layout(lines):
+        return receipt_parser.parse_receipt(build_layout(lines, clean=receipt_parser.clean_line))
+
+    layout_time, layout_receipt = best_of(args.repeat, parse_layout, ocr_lines)
+
+    print(f"{args.lines} synthetic lines, {len(new_cleaned)} after cleaning, {len(items)} items")
+    for label, old, new in (('clean+skip', old_clean_time, new_clean_time),
+                            ('parse', old_parse_time, new_parse_time)):
+        print(f"  {label:<11} old {old * 1000:8.2f} ms   new {new * 1000:8.2f} ms   {old / new:5.2f}x")
+    print(f"  layout      clean+columns+parse {layout_time * 1000:8.2f} ms   "
+          f"({len(layout_receipt.items)} items; lines {(new_clean_time + new_parse_time) * 1000:.2f} ms)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Per-stage time and peak memory of receipt preprocessing.
+
+Compares ReceiptParser.preprocess_image (numpy/OpenCV only) with the
+previous PIL round-trip pipeline, on the sample receipts in uploads/ by
+default. Each pipeline runs in its own process so peak RSS isn't shared.
+
+    python benchmarks/preprocess_benchmark.py [--repeat N] [images ...]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import resource
+import multiprocessing
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def pil_pipeline(path, timings):
+    """The PIL -> numpy -> PIL path preprocess_image used to take."""
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageOps
+    from algorithm import stage_timer
+
+    with stage_timer(timings, 'decode'):
+        img = Image.open(path)
+        gray_img = img.convert('L')
+    with stage_timer(timings, 'autocontrast'):
+        gray_img = ImageOps.autocontrast(gray_img, cutoff=1)
+    with stage_timer(timings, 'to_numpy'):
+        np_img = np.array(gray_img)
+    with stage_timer(timings, 'blur'):
+        blurred = cv2.GaussianBlur(np_img, (3, 3), 0)
+    with stage_timer(timings, 'threshold'):
+        thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 11)
+    with stage_timer(timings, 'dilate'):
+        dilated = cv2.dilate(thresh, np.ones((2, 2), np.uint8), iterations=1)
+    with stage_timer(timings, 'to_pil'):
+        processed = Image.fromarray(dilated)
+    # extract_text converted back to numpy for EasyOCR
+    with stage_timer(timings, 'ocr_handoff'):
+        np.array(processed)
+    img.close()
+
+def numpy_pipeline(path, timings):
+    from algorithm import ReceiptParser
+    ReceiptParser().preprocess_image(path, timings=timings)
+
+PIPELINES = {'pil': pil_pipeline, 'numpy': numpy_pipeline}
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def run_pipeline(name, images, repeat, queue):
+    import algorithm  # noqa: F401 - import cost is not part of the measurement
+    pipeline = PIPELINES[name]
+    baseline = peak_rss_mb()
+    totals = defaultdict(float)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in images:
+            pipeline(path, totals)
+    elapsed = time.perf_counter() - start
+    runs = repeat * len(images)
+    queue.put({
+        'stages_ms': {stage: 1000 * seconds / runs for stage, seconds in totals.items()},
+        'total_ms': 1000 * elapsed / runs,
+        'peak_rss_growth_mb': peak_rss_mb() - baseline
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('images', nargs='*', help='receipt images (default: uploads/*)')
+    parser.add_argument('--repeat', type=int, default=10, help='passes over the image set')
+    args = parser.parse_args()
+
+    images = args.images or sorted(glob.glob(os.path.join(ROOT, 'uploads', '*')))
+    if not images:
+        parser.error('no images to benchmark')
+
+    ctx = multiprocessing.get_context('spawn')
+    results = {}
+    for name in PIPELINES:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_pipeline, args=(name, images, args.repeat, queue))
+        process.start()
+        results[name] = queue.get()
+        process.join()
+
+    print(f"{len(images)} image(s) x {args.repeat} passes, mean per image")
+    for name, result in results.items():
+        print(f"\n{name}: {result['total_ms']:.2f} ms total, "
+              f"peak RSS +{result['peak_rss_growth_mb']:.1f} MB")
+        for stage, ms in result['stages_ms'].items():
+            print(f"  {stage:<13} {ms:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
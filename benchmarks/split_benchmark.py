@@ -0,0 +1,120 @@
+"""Time and accuracy of splitting a big group bill.
+
+Compares split_engine.split_receipt with the per-item rounding loop
+assign_items used before, on random bills (500 items x 50 people by
+default), and reports how far each one's shares drift from the total.
+Also times reassigning one item on the assign page: a full split_receipt
+against a LiveSplit update, session round trip included.
+
+    python benchmarks/split_benchmark.py [--items 500] [--people 50] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from split_engine import split_receipt, LiveSplit  # noqa: E402
+
+def round_decimal(value):
+    return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def legacy_split(items, assignments, tax, tip):
+    """The nested rounding loop assign_items used before split_engine."""
+    subtotal = sum(Decimal(str(item['price'])) for item in items)
+    individual_costs = defaultdict(Decimal)
+    tax_rate = Decimal(tax) / subtotal
+    tip_rate = Decimal(tip) / subtotal
+    for item in items:
+        item_price = Decimal(str(item['price']))
+        assigned_to = assignments[item['name']]
+        price_per_person = item_price / Decimal(len(assigned_to))
+        for person in assigned_to:
+            individual_costs[person] += round_decimal(price_per_person)
+        item_tax = round_decimal(item_price * tax_rate)
+        item_tip = round_decimal(item_price * tip_rate)
+        tax_per_person = item_tax / Decimal(len(assigned_to))
+        tip_per_person = item_tip / Decimal(len(assigned_to))
+        for person in assigned_to:
+            individual_costs[person] += round_decimal(tax_per_person)
+            individual_costs[person] += round_decimal(tip_per_person)
+    return {person: round_decimal(cost) for person, cost in individual_costs.items()}
+
+def random_bill(items, people, seed=0):
+    rng = random.Random(seed)
+    names = [f"Person {j + 1}" for j in range(people)]
+    bill = [{'name': f"Item {i + 1}", 'price': float(Decimal(rng.randint(99, 9999)).scaleb(-2))}
+            for i in range(items)]
+    assignments = {item['name']: rng.sample(names, rng.randint(1, min(people, 7))) for item in bill}
+    subtotal = sum(Decimal(str(item['price'])) for item in bill)
+    tax = round_decimal(subtotal * Decimal('0.0825'))
+    tip = round_decimal(subtotal * Decimal('0.18'))
+    return names, bill, assignments, tax, tip, subtotal + tax + tip
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--people', type=int, default=50)
+    parser.add_argument('--bills', type=int, default=20, help='random bills checked for drift')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per timing (best is reported)')
+    args = parser.parse_args()
+
+    def engine(names, bill, assignments, tax, tip):
+        return split_receipt([item['price'] for item in bill],
+                             [assignments[item['name']] for item in bill], names, tax, tip).totals()
+
+    names, bill, assignments, tax, tip, _ = random_bill(args.items, args.people)
+    legacy_time, _ = best_of(args.repeat, legacy_split, bill, assignments, tax, tip)
+    engine_time, _ = best_of(args.repeat, engine, names, bill, assignments, tax, tip)
+
+    legacy_drift, engine_drift = [], []
+    for seed in range(args.bills):
+        names, bill, assignments, tax, tip, total = random_bill(args.items, args.people, seed)
+        legacy_drift.append(abs(sum(legacy_split(bill, assignments, tax, tip).values()) - total))
+        engine_drift.append(abs(sum(engine(names, bill, assignments, tax, tip).values()) - total))
+
+    # One reassignment at a time, each a request that loads and saves the session
+    names, bill, assignments, tax, tip, _ = random_bill(args.items, args.people)
+    prices = [item['price'] for item in bill]
+    assignees = [assignments[item['name']] for item in bill]
+    rng = random.Random(1)
+    changes = [(rng.randrange(len(bill)), rng.sample(names, rng.randint(1, min(args.people, 7)))) for _ in range(50)]
+    live = LiveSplit.create(prices, names, tax, tip, assignees)
+    full_times, update_times, session_times = [], [], []
+    for index, names_on_item in changes:
+        assignees[index] = names_on_item
+        start = time.perf_counter()
+        split_receipt(prices, assignees, names, tax, tip).totals()
+        full_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        live.assign(index, names_on_item)
+        update_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        live = LiveSplit.from_dict(json.loads(json.dumps(live.to_dict())))
+        session_times.append(time.perf_counter() - start)
+    full, update, session = (sorted(times)[len(times) // 2] for times in (full_times, update_times, session_times))
+
+    print(f"{args.items} items x {args.people} people")
+    print(f"  legacy  {legacy_time * 1000:8.2f} ms   max drift ${max(legacy_drift)}")
+    print(f"  engine  {engine_time * 1000:8.2f} ms   max drift ${max(engine_drift)}   "
+          f"{legacy_time / engine_time:.1f}x faster")
+    print(f"  reassign one item: full split {full * 1000:.2f} ms, live update {update * 1000:.2f} ms "
+          f"(+ {session * 1000:.2f} ms session JSON round trip)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Startup time and baseline memory of the web tier.
+
+Starts fresh interpreters that import the Flask app and serve one page,
+and reports the import time, the first request's latency, resident
+memory and which heavy OCR modules got loaded. The ``web`` run is the
+app as deployed; the ``eager`` run imports the OCR stack first (EasyOCR, and
+with it torch), which is what every web process paid before OCR was
+loaded on first use.
+
+    python benchmarks/startup_benchmark.py [--repeat 5]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('algorithm', 'cv2', 'easyocr', 'torch', 'scipy', 'skimage', 'pytesseract', 'tesserocr', 'fitz')
+
+# Runs in the child interpreter; prints one JSON line
+_CHILD = '''
+import sys, json, time, logging, resource
+logging.disable(logging.CRITICAL)
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak rather than current; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+start = time.perf_counter()
+if {eager}:
+    import easyocr
+    import algorithm
+import app
+imported = time.perf_counter() - start
+
+client = app.app.test_client()
+start = time.perf_counter()
+status = client.get('/').status_code
+first_request = time.perf_counter() - start
+
+print(json.dumps({{
+    'import': imported,
+    'first_request': first_request,
+    'status': status,
+    'rss': rss_mb(),
+    'modules': len(sys.modules),
+    'heavy': [name for name in {heavy!r} if name in sys.modules]
+}}))
+'''
+
+def run_child(eager):
+    code = _CHILD.format(eager=eager, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'child failed')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per mode')
+    args = parser.parse_args()
+
+    print(f"{args.repeat} fresh interpreters per mode, medians")
+    results = {}
+    for name, eager in (('web', False), ('eager', True)):
+        try:
+            runs = [run_child(eager) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"  {name:<6} skipped: {e}")
+            continue
+        results[name] = r = {
+            'import': median([run['import'] for run in runs]),
+            'first_request': median([run['first_request'] for run in runs]),
+            'rss': median([run['rss'] for run in runs]),
+            'modules': median([run['modules'] for run in runs]),
+            'heavy': runs[-1]['heavy']
+        }
+        print(f"  {name:<6} import {r['import'] * 1000:7.1f} ms   first request {r['first_request'] * 1000:6.1f} ms   "
+              f"RSS {r['rss']:6.1f} MB   {r['modules']} modules   OCR modules loaded: {', '.join(r['heavy']) or 'none'}")
+
+    if len(results) == 2:
+        web, eager = results['web'], results['eager']
+        print(f"  lazy OCR imports save {(eager['import'] - web['import']) * 1000:.0f} ms of startup "
+              f"and {eager['rss'] - web['rss']:.0f} MB per web process")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Per-call latency of the Tesseract backends.
+
+Runs the same preprocessed synthetic receipts through the pytesseract
+path (temp file plus a tesseract process per call) and the resident
+tesserocr API, and reports the first call, median and p95 latency,
+throughput with several threads, and whether both read the same words.
+Backends that aren't installed are reported as skipped.
+
+    python benchmarks/tesseract_benchmark.py [--receipts 6] [--repeat 3] [--threads 4]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus_benchmark import render_receipt, SYNTHETIC_VARIANTS  # noqa: E402
+from tesseract_engine import ResidentTesseract, SubprocessTesseract  # noqa: E402
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def words(data):
+    return [text for text in data['text'] if text.strip()]
+
+def measure(engine, images, repeat, threads):
+    start = time.perf_counter()
+    first = engine.image_to_data(images[0])
+    cold = time.perf_counter() - start
+
+    latencies = []
+    results = [first] + [None] * (len(images) - 1)
+    for _ in range(repeat):
+        for i, image in enumerate(images):
+            start = time.perf_counter()
+            results[i] = engine.image_to_data(image)
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(engine.image_to_data, images * repeat))
+        elapsed = time.perf_counter() - start
+    return {
+        'cold': cold,
+        'median': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'throughput': len(images) * repeat / elapsed,
+        'words': [words(result) for result in results]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=6, help='synthetic receipts to render')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the receipts per measurement')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 2, help='threads for the throughput run')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    from algorithm import ReceiptParser
+    receipt_parser = ReceiptParser()
+    images = []
+    for seed in range(args.receipts):
+        data, _ = render_receipt(seed, *SYNTHETIC_VARIANTS[seed % len(SYNTHETIC_VARIANTS)])
+        images.append(receipt_parser.preprocess_image(data))
+    pixels = sum(image.size for image in images) / len(images)
+    print(f"{len(images)} preprocessed receipts, {pixels / 1e6:.2f} Mpx on average, "
+          f"{args.repeat} passes, {args.threads} threads")
+
+    backends = {
+        'subprocess': lambda: SubprocessTesseract(),
+        'resident': lambda: ResidentTesseract(size=args.threads, tessdata=os.getenv('TESSDATA_PREFIX') or None)
+    }
+    results = {}
+    for name, create in backends.items():
+        try:
+            results[name] = measure(create(), images, args.repeat, args.threads)
+        except Exception as e:
+            print(f"  {name:<11} skipped: {type(e).__name__}: {e}")
+            continue
+        r = results[name]
+        print(f"  {name:<11} first {r['cold'] * 1000:7.1f} ms   median {r['median'] * 1000:7.1f} ms   "
+              f"p95 {r['p95'] * 1000:7.1f} ms   {r['throughput']:6.2f} receipts/s")
+
+    if len(results) == 2:
+        same = sum(a == b for a, b in zip(results['subprocess']['words'], results['resident']['words']))
+        speedup = results['subprocess']['median'] / results['resident']['median']
+        print(f"  resident is {speedup:.2f}x faster per call; identical words on {same}/{len(images)} receipts")
+
+if __name__ == '__main__':
+    main()
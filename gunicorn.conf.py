@@ -0,0 +1,49 @@
+import os
+import threading
+
+from ocr_workers import limit_threads
+
+job_backend_name = os.getenv('JOB_BACKEND', 'inprocess')
+
+# The inprocess and supervised backends keep each job in the worker that
+# accepted it, and status polls and event streams must reach that worker,
+# so they get exactly one worker and serve requests from threads.
+# WEB_CONCURRENCY (which Heroku sets from the dyno size) only applies to a
+# shared, broker-backed JOB_BACKEND.
+jobs_in_worker = job_backend_name in ('inprocess', 'supervised')
+requested_workers = int(os.getenv('WEB_CONCURRENCY', 1))
+workers = 1 if jobs_in_worker else requested_workers
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Load the OCR models in each worker as soon as it is forked, so the first
+# upload a worker handles doesn't pay the EasyOCR model load. The app
+# itself doesn't import the OCR stack, and the warm-up runs in the
+# background, so pages are served while the models load. With
+# JOB_BACKEND=supervised, OCR runs in separate worker processes instead,
+# which are started alongside each web worker and warm up themselves.
+ocr_warmup = os.getenv('OCR_WARMUP', '1') == '1'
+
+def on_starting(server):
+    if workers != requested_workers:
+        server.log.warning(
+            f"Running 1 worker instead of WEB_CONCURRENCY={requested_workers}: JOB_BACKEND={job_backend_name} "
+            f"keeps jobs in the worker that accepted them"
+        )
+
+def post_fork(server, worker):
+    # Split the cores between web workers before torch or OpenCV size their thread pools
+    limit_threads((os.cpu_count() or 1) // workers)
+    if not ocr_warmup or job_backend_name != 'inprocess':
+        return
+
+    def warm_up():
+        from algorithm import warm_up_ocr, get_reader_stats
+        warm_up_ocr()
+        server.log.info(f"Worker {worker.pid} OCR warm-up done: {get_reader_stats()}")
+
+    threading.Thread(target=warm_up, name='ocr-warmup', daemon=True).start()
+
+def post_worker_init(worker):
+    if job_backend_name == 'supervised':
+        from app import job_backend
+        job_backend.start()
@@ -0,0 +1,195 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class QueueFullError(Exception):
+    """Raised when a backend refuses new work because its queue is full."""
+
+@dataclass
+class Job:
+    id: str
+    status: str = QUEUED
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def timing(self) -> Dict:
+        """Seconds spent waiting in the queue and running, where known."""
+        timing = {}
+        if self.started_at is not None:
+            timing['queue_seconds'] = round(self.started_at - self.created_at, 3)
+        if self.finished_at is not None and self.started_at is not None:
+            timing['run_seconds'] = round(self.finished_at - self.started_at, 3)
+            timing['total_seconds'] = round(self.finished_at - self.created_at, 3)
+        return timing
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'timing': self.timing()
+        }
+
+class JobBackend:
+    """Interface for OCR job backends.
+
+    A backend accepts a module-level callable plus arguments, runs it
+    somewhere, and lets the web tier look the job up by id.  Backends
+    that hand work to a broker must be able to pickle the callable.
+    """
+
+    def submit(self, func: Callable, *args) -> Job:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Block until the job changes state or the timeout passes."""
+        time.sleep(timeout)
+        return self.get(job_id)
+
+    def stats(self) -> Dict:
+        return {}
+
+class InProcessJobBackend(JobBackend):
+    """Runs jobs on a bounded thread pool inside the web process.
+
+    Jobs only live in this process, so status lookups must reach the same
+    gunicorn worker that accepted the upload (one worker, several threads).
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, job_ttl: float = 600):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Job] = {}
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so no threads exist before gunicorn forks
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr-job')
+        return self._executor
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, func: Callable, *args) -> Job:
+        with self._cond:
+            self._expire()
+            if self._active >= self.workers + self.max_queue:
+                raise QueueFullError(f"{self._active} OCR jobs already queued or running")
+            job = Job(id=uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._active += 1
+
+        self._get_executor().submit(self._run, job, func, args)
+        logger.info(f"Queued job {job.id} ({self._active} active)")
+        return job
+
+    def _run(self, job: Job, func: Callable, args) -> None:
+        with self._cond:
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._cond.notify_all()
+        try:
+            result = self._execute(func, args)
+            status, error = DONE, None
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            result, status, error = None, FAILED, str(e)
+
+        with self._cond:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished_at = time.time()
+            self._active -= 1
+            self._cond.notify_all()
+        logger.info(f"Job {job.id} {status}: {job.timing()}")
+
+    def _execute(self, func: Callable, args) -> Dict:
+        """Run one job's callable; called on a pool thread."""
+        return func(*args)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            status = job.status
+            self._cond.wait_for(lambda: job.status != status, timeout=timeout)
+            return job
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            return {
+                'active': self._active,
+                'queued': queued,
+                'running': self._active - queued,
+                'capacity': self.workers + self.max_queue,
+                'tracked': len(self._jobs)
+            }
+
+def run_ocr_job(upload):
+    """Job body: parse an uploaded receipt, closing any spill file afterwards."""
+    try:
+        # The first job in a process pays for loading the OCR stack
+        from algorithm import parse_receipt_image
+        return parse_receipt_image(upload)
+    finally:
+        if hasattr(upload, 'close'):
+            upload.close()
+
+def create_job_backend() -> JobBackend:
+    """Build the backend named by JOB_BACKEND.
+
+    ``inprocess`` (the default) uses InProcessJobBackend and ``supervised``
+    runs jobs in OCR worker processes (ocr_workers.SupervisedJobBackend);
+    any other value is treated as a ``module:ClassName`` path to a
+    JobBackend subclass, which is how a broker-backed implementation is
+    swapped in.
+    """
+    name = os.getenv('JOB_BACKEND', 'inprocess')
+    workers = int(os.getenv('OCR_JOB_WORKERS', 2))
+    max_queue = int(os.getenv('OCR_JOB_QUEUE', 8))
+    if name == 'inprocess':
+        return InProcessJobBackend(workers=workers, max_queue=max_queue)
+    if name == 'supervised':
+        from ocr_workers import SupervisedJobBackend, WorkerLimits
+        return SupervisedJobBackend(workers=workers, max_queue=max_queue, limits=WorkerLimits.from_env())
+    module_name, _, class_name = name.partition(':')
+    backend_cls = getattr(importlib.import_module(module_name), class_name)
+    return backend_cls()
@@ -0,0 +1,209 @@
+import bisect
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bucket bounds in seconds, from a fast parse up to a slow OCR pass
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+# Samples kept per label set for p50/p95/p99
+QUANTILE_WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+def _label_text(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        # Samples are <name>_total, and the text format wants HELP/TYPE to name them
+        self.family = f"{name}_total"
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.family}{_label_text(key)} {_number(value)}" for key, value in sorted(values.items())]
+
+class Histogram:
+    """Cumulative buckets, sum and count per label set, plus recent-window quantiles.
+
+    Buckets and totals follow the Prometheus histogram format. p50/p95/p99
+    come from the last QUANTILE_WINDOW observations and are exposed as a
+    ``<name>_quantile`` gauge, so they're readable without PromQL.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.family = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'sum': 0.0,
+                    'window': deque(maxlen=QUANTILE_WINDOW)
+                }
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['window'].append(value)
+
+    def quantiles(self, **labels) -> Dict[float, float]:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            window = sorted(series['window']) if series else []
+        if not window:
+            return {}
+        return {q: window[min(len(window) - 1, int(q * len(window)))] for q in QUANTILES}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            snapshot = {
+                key: (list(series['counts']), series['sum'], sorted(series['window']))
+                for key, series in self._series.items()
+            }
+        lines = []
+        for key, (counts, total, _) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _label_text(key, 'le="%s"' % _number(bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(key)} {cumulative}")
+        quantile_lines = []
+        for key, (_, _, window) in sorted(snapshot.items()):
+            for q in QUANTILES:
+                value = window[min(len(window) - 1, int(q * len(window)))]
+                labels = _label_text(key, 'quantile="%s"' % q)
+                quantile_lines.append(f"{self.name}_quantile{labels} {_number(value)}")
+        if quantile_lines:
+            lines.append(f"# HELP {self.name}_quantile {self.help} (last {QUANTILE_WINDOW} observations)")
+            lines.append(f"# TYPE {self.name}_quantile gauge")
+            lines.extend(quantile_lines)
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def register_stats(self, prefix: str, stats: Callable[[], Dict]) -> None:
+        """Expose every number in a ``stats()`` dict as a ``<prefix>_<key>`` gauge."""
+        with self._lock:
+            self._collectors = [c for c in self._collectors if c[0] != prefix] + [(prefix, stats)]
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.family} {metric.help}")
+            lines.append(f"# TYPE {metric.family} {metric.kind}")
+            lines.extend(metric.samples())
+        for prefix, stats in collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.error(f"Collecting {prefix} stats failed: {str(e)}")
+                continue
+            for name, value in _flatten(prefix, values):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+def _flatten(prefix: str, values: Dict) -> List[Tuple[str, float]]:
+    flat = []
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            flat.extend(_flatten(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat.append((name, value))
+    return flat
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram('receipt_stage_seconds', 'Time spent in each receipt pipeline stage')
+ENGINE_FAILURES = REGISTRY.counter('ocr_engine_failures', 'OCR engine runs that raised')
+IMAGE_BYTES = REGISTRY.histogram(
+    'receipt_image_bytes', 'Encoded size of receipt images',
+    buckets=(50e3, 100e3, 250e3, 500e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+)
+IMAGE_PIXELS = REGISTRY.histogram(
+    'receipt_image_pixels', 'Decoded pixel count of receipt images',
+    buckets=(0.25e6, 0.5e6, 1e6, 2e6, 4e6, 8e6, 12e6, 16e6, 24e6, 48e6)
+)
+REQUEST_SECONDS = REGISTRY.histogram('http_request_seconds', 'Time to handle each route')
+OCR_PASSES = REGISTRY.histogram('receipt_ocr_passes', 'Full OCR passes needed per image', buckets=(1, 2, 3, 4, 5))
+OCR_VARIANTS = REGISTRY.counter('receipt_preprocess_variant', 'Threshold variant whose OCR was used, by image condition')
+
+# Stage timings of the request being handled on this thread, for Server-Timing
+_request_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_trace', default=None)
+
+def start_trace() -> None:
+    _request_trace.set({})
+
+def end_trace() -> Optional[Dict[str, float]]:
+    trace = _request_trace.get()
+    _request_trace.set(None)
+    return trace
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Observe a stage duration and add it to the current request's trace."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _request_trace.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds
+
+def server_timing(trace: Dict[str, float], total: float) -> str:
+    """``Server-Timing`` header value for a request's stage trace."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
@@ -0,0 +1,358 @@
+import os
+import sys
+import time
+import queue
+import logging
+import resource
+import threading
+import multiprocessing
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Optional
+
+from jobs import InProcessJobBackend
+
+logger = logging.getLogger(__name__)
+
+# Native thread pools sized from the environment when their library loads
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'OPENCV_FOR_THREADS_NUM',
+                   # and this app's own OCR pools (algorithm, tesseract_engine)
+                   'OCR_TILE_WORKERS', 'TESSERACT_POOL_SIZE')
+
+# The thread settings the operator exported, read before limit_threads
+# writes its own; spawned workers inherit the written values, so they are
+# handed this set rather than reading their environment
+OPERATOR_THREAD_VARS = frozenset(name for name in THREAD_ENV_VARS if name in os.environ)
+
+# How often a worker's liveness, wall-clock time and memory are checked during a job
+POLL_SECONDS = 0.2
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+class WorkerLimitError(Exception):
+    """An OCR worker was killed for exceeding a limit, or died, while running a job."""
+
+class WorkerJobError(Exception):
+    """A job raised inside its OCR worker; carries the original message."""
+
+def limit_threads(threads: int, keep: FrozenSet[str] = OPERATOR_THREAD_VARS) -> None:
+    """Size OpenMP/BLAS, OpenCV, torch and the OCR pools for ``threads`` cores.
+
+    Environment variables only take effect for libraries not loaded yet,
+    so call this before the OCR stack is imported; cv2 and torch are also
+    set directly if they already are. Variables in ``keep`` (those the
+    operator set) win; the rest are overwritten, including values an
+    earlier call wrote for a different share of the cores.
+    """
+    threads = max(1, threads)
+    for name in THREAD_ENV_VARS:
+        if name not in keep:
+            os.environ[name] = str(threads)
+    cv2 = sys.modules.get('cv2')
+    if cv2 is not None and 'OPENCV_FOR_THREADS_NUM' not in keep:
+        cv2.setNumThreads(threads)
+    torch = sys.modules.get('torch')
+    if torch is not None and 'OMP_NUM_THREADS' not in keep:
+        torch.set_num_threads(threads)
+
+def process_rss(pid: int) -> Optional[int]:
+    """Resident memory of a process in bytes, or None where /proc isn't available."""
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _usage() -> Dict:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    peak = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {
+        'rss_mb': round((process_rss(os.getpid()) or peak) / 2**20, 1),
+        'peak_rss_mb': round(peak / 2**20, 1),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3)
+    }
+
+def _worker_main(conn, threads: int, warm_up: bool, keep: FrozenSet[str]) -> None:
+    """OCR worker process: run the jobs sent over ``conn`` until it is closed or sent None.
+
+    ``keep`` is the parent's OPERATOR_THREAD_VARS; this process's
+    environment also holds the web worker's own limits, which it replaces.
+    """
+    logging.basicConfig(level=logging.INFO)
+    limit_threads(threads, keep)
+    if warm_up:
+        try:
+            from algorithm import warm_up_ocr
+            warm_up_ocr()
+        except Exception as e:
+            # Jobs still run and report the underlying error themselves
+            logger.error(f"OCR warm-up failed: {str(e)}")
+        limit_threads(threads, keep)
+    conn.send(_usage())
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        func, args = message
+        try:
+            reply = (True, func(*args))
+        except Exception as e:
+            reply = (False, str(e))
+        # torch and OpenCV were imported by the first job at the latest
+        limit_threads(threads, keep)
+        try:
+            conn.send(reply + (_usage(),))
+        except Exception as e:
+            conn.send((False, f"Could not return the result: {str(e)}", _usage()))
+
+@dataclass
+class WorkerLimits:
+    """Resource limits of supervised OCR workers; 0 disables a limit."""
+    job_timeout: float = 120  # wall-clock seconds per job
+    job_max_rss_mb: int = 3072  # a worker above this mid-job is killed and the job fails
+    max_jobs: int = 500  # a worker is replaced after this many jobs
+    max_rss_mb: int = 1536  # ... or when a job leaves it above this
+    threads: int = 0  # native threads per worker; 0 shares the cores between workers
+    start_timeout: float = 300  # for spawning a worker and loading its models
+    warm_up: bool = True
+
+    @classmethod
+    def from_env(cls) -> "WorkerLimits":
+        return cls(
+            job_timeout=float(os.getenv('OCR_JOB_TIMEOUT', 120)),
+            job_max_rss_mb=int(os.getenv('OCR_JOB_MAX_RSS_MB', 3072)),
+            max_jobs=int(os.getenv('OCR_WORKER_MAX_JOBS', 500)),
+            max_rss_mb=int(os.getenv('OCR_WORKER_MAX_RSS_MB', 1536)),
+            threads=int(os.getenv('OCR_WORKER_THREADS', 0)),
+            warm_up=os.getenv('OCR_WARMUP', '1') == '1'
+        )
+
+class OCRWorker:
+    """One OCR worker process, watched while it runs a job and replaced when it must be.
+
+    A worker that dies, runs past the job timeout or grows past the job
+    memory limit is killed and the job fails; one that has run
+    ``max_jobs`` jobs or is left above ``max_rss_mb`` is retired after
+    its job and started afresh.
+    """
+
+    def __init__(self, index: int, limits: WorkerLimits, threads: int):
+        self.index = index
+        self.limits = limits
+        self.threads = threads
+        self._process = None
+        self._conn = None
+        self._jobs = 0  # since the process started
+        self._rss_mb = 0.0
+        # Held while starting, running a job or stopping
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'pid': 0, 'jobs': 0, 'failed': 0, 'starts': 0, 'recycled': 0, 'timeouts': 0,
+            'memory_kills': 0, 'crashes': 0, 'rss_mb': 0.0, 'peak_rss_mb': 0.0,
+            'cpu_seconds': 0.0, 'start_seconds': 0.0, 'last_job_seconds': 0.0
+        }
+
+    def _count(self, key: str, **values) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+            self._stats.update(values)
+
+    def _start(self) -> None:
+        context = multiprocessing.get_context('spawn')
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_main, args=(child_conn, self.threads, self.limits.warm_up, OPERATOR_THREAD_VARS),
+            name=f'ocr-worker-{self.index}', daemon=True
+        )
+        start = time.perf_counter()
+        process.start()
+        child_conn.close()
+        self._process, self._conn, self._jobs = process, conn, 0
+        # Model loading doesn't count against the first job's timeout
+        try:
+            if not conn.poll(self.limits.start_timeout):
+                raise EOFError
+            usage = conn.recv()
+        except (EOFError, OSError):
+            self._kill('crashes')
+            raise WorkerLimitError(f"OCR worker {self.index} failed to start")
+        elapsed = time.perf_counter() - start
+        self._rss_mb = usage['rss_mb']
+        self._count('starts', pid=process.pid, start_seconds=round(elapsed, 3), **usage)
+        logger.info(f"OCR worker {self.index} started as pid {process.pid} in {elapsed:.2f}s, {usage['rss_mb']} MB")
+
+    def _kill(self, reason: str) -> None:
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+            logger.warning(f"OCR worker {self.index} (pid {self._process.pid}) killed: {reason}")
+        self._process = self._conn = None
+        self._count(reason, pid=0, rss_mb=0.0)
+
+    def _stop(self) -> None:
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._start()
+
+    @property
+    def recycle_reason(self) -> Optional[str]:
+        """Why this worker should be replaced before its next job, if it should."""
+        if self._process is None:
+            return None
+        if self.limits.max_jobs and self._jobs >= self.limits.max_jobs:
+            return f"{self._jobs} jobs"
+        if self.limits.max_rss_mb and self._rss_mb > self.limits.max_rss_mb:
+            return f"{self._rss_mb:.0f} MB resident"
+        return None
+
+    @property
+    def needs_replacing(self) -> bool:
+        """True once the process was killed, or should be retired."""
+        return self._process is None or self.recycle_reason is not None
+
+    def replace(self) -> None:
+        """Retire or restart the process as needed, leaving a fresh (and warmed up) one."""
+        with self._lock:
+            reason = self.recycle_reason
+            if reason is not None:
+                logger.info(f"Recycling OCR worker {self.index} (pid {self._process.pid}) after {reason}")
+                self._stop()
+                self._count('recycled', pid=0)
+            if self._process is None:
+                self._start()
+
+    def run(self, func: Callable, args) -> Dict:
+        """Run ``func(*args)`` in the worker process and return its result."""
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._start()
+            limits = self.limits
+            start = time.monotonic()
+            self._conn.send((func, args))
+            while not self._conn.poll(POLL_SECONDS):
+                if not self._process.is_alive():
+                    self._kill('crashes')
+                    raise WorkerLimitError("The OCR worker exited while processing the receipt")
+                if limits.job_timeout and time.monotonic() - start > limits.job_timeout:
+                    self._kill('timeouts')
+                    raise WorkerLimitError(f"OCR took longer than {limits.job_timeout:.0f}s")
+                rss = process_rss(self._process.pid)
+                if limits.job_max_rss_mb and rss is not None and rss > limits.job_max_rss_mb * 2**20:
+                    self._kill('memory_kills')
+                    raise WorkerLimitError(f"OCR needed more than {limits.job_max_rss_mb} MB of memory")
+            try:
+                ok, value, usage = self._conn.recv()
+            except (EOFError, OSError):
+                self._kill('crashes')
+                raise WorkerLimitError("The OCR worker exited while processing the receipt")
+
+            self._jobs += 1
+            self._rss_mb = usage['rss_mb']
+            self._count('jobs', last_job_seconds=round(time.monotonic() - start, 3), **usage)
+            if not ok:
+                self._count('failed')
+                raise WorkerJobError(value)
+            return value
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return dict(self._stats)
+
+def _picklable(arg):
+    # Spilled uploads are open temp files; the worker gets their bytes
+    if hasattr(arg, 'read'):
+        try:
+            return arg.read()
+        finally:
+            arg.close()
+    return arg
+
+class SupervisedJobBackend(InProcessJobBackend):
+    """Runs OCR jobs in supervised worker processes, one job per process at a time.
+
+    Job ids, status and the queue limit work as in InProcessJobBackend,
+    whose threads each hand a job to an idle OCRWorker and wait for it.
+    The web process never loads the OCR stack, and a job that hangs, leaks
+    or crashes takes down only its worker, which is replaced. Callables
+    and arguments must pickle; open files are sent as their bytes.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, limits: Optional[WorkerLimits] = None,
+                 job_ttl: float = 600):
+        super().__init__(workers=workers, max_queue=max_queue, job_ttl=job_ttl)
+        self.limits = limits or WorkerLimits()
+        threads = self.limits.threads or max(1, (os.cpu_count() or 1) // workers)
+        self._workers = [OCRWorker(i, self.limits, threads) for i in range(workers)]
+        self._idle: "queue.Queue[OCRWorker]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def start(self) -> None:
+        """Start every worker process in the background, so the first jobs don't wait for model loading."""
+        for worker in self._workers:
+            threading.Thread(target=self._start_worker, args=(worker,), name=f'ocr-worker-{worker.index}-start',
+                             daemon=True).start()
+
+    def _start_worker(self, worker: OCRWorker) -> None:
+        try:
+            worker.ensure_started()
+        except WorkerLimitError as e:
+            logger.error(str(e))
+
+    def _execute(self, func: Callable, args) -> Dict:
+        args = tuple(_picklable(arg) for arg in args)
+        worker = self._idle.get()
+        try:
+            return worker.run(func, args)
+        finally:
+            if worker.needs_replacing:
+                # Replaced off the job's thread, so the job finishes without waiting for the new process
+                threading.Thread(target=self._replace, args=(worker,), name=f'ocr-worker-{worker.index}-replace',
+                                 daemon=True).start()
+            else:
+                self._idle.put(worker)
+
+    def _replace(self, worker: OCRWorker) -> None:
+        try:
+            worker.replace()
+        except WorkerLimitError as e:
+            logger.error(str(e))
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.shutdown()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        workers = [worker.stats() for worker in self._workers]
+        for key in ('starts', 'recycled', 'timeouts', 'memory_kills', 'crashes'):
+            stats[key] = sum(worker[key] for worker in workers)
+        stats['rss_mb'] = round(sum(worker['rss_mb'] for worker in workers), 1)
+        stats['workers'] = {str(index): usage for index, usage in enumerate(workers)}
+        return stats
@@ -0,0 +1,238 @@
+import os
+import struct
+import logging
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE = 'image'
+PDF = 'pdf'
+HTML = 'html'
+TEXT = 'text'
+
+# Scanned PDF pages are rendered at this resolution before OCR
+PDF_RASTER_DPI = 300
+
+# Images declaring more pixels than this are rejected before decoding
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 50_000_000))
+
+# JPEG start-of-frame markers, which carry the dimensions (not DHT, JPG or DAC)
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# JPEG markers without a length field
+_JPEG_STANDALONE = set(range(0xD0, 0xDA)) | {0x01}
+
+class ImageRejectedError(ValueError):
+    """An image refused before decoding; ``status`` is the HTTP status to answer with."""
+    status = 400
+
+class ImageTooLargeError(ImageRejectedError):
+    """An image whose header declares more than MAX_IMAGE_PIXELS."""
+    status = 413
+
+class UnreadableImageError(ImageRejectedError):
+    """An image whose dimensions can't be read from its header, so its size can't be checked."""
+    status = 415
+
+_IMAGE_SIGNATURES = (b'\x89PNG', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'II*\x00', b'MM\x00*')
+# BITMAPCOREHEADER through BITMAPV5HEADER (and the OS/2 variants)
+_BMP_DIB_SIZES = {12, 16, 40, 52, 56, 64, 108, 124}
+_HTML_MARKERS = ('<!doctype html', '<html', '<body', '<table', '<div', '<p>', '<br')
+
+def _is_bmp(head: bytes) -> bool:
+    """'BM' plus a header that adds up, so text such as "BMW Grill" isn't taken for a bitmap."""
+    if len(head) < 18 or not head.startswith(b'BM'):
+        return False
+    file_size, reserved, _, dib_size = struct.unpack_from('<IIII', head, 2)
+    return reserved == 0 and dib_size in _BMP_DIB_SIZES and (file_size == 0 or file_size >= 14 + dib_size)
+
+def document_kind(buffer) -> str:
+    """Sniff whether an upload is an image, a PDF, HTML or plain text from its bytes."""
+    head = bytes(buffer[:2048])
+    if head.startswith(_IMAGE_SIGNATURES) or _is_bmp(head) or (head[:4] == b'RIFF' and head[8:12] == b'WEBP'):
+        return IMAGE
+    if head.lstrip().startswith(b'%PDF-'):
+        return PDF
+    try:
+        text = head.decode('utf-8-sig')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sniffed block is fine
+        if e.start < len(head) - 3:
+            return IMAGE
+        text = head[:e.start].decode('utf-8-sig')
+    if '\x00' in text:
+        return IMAGE
+    lowered = text.lower()
+    if lowered.lstrip().startswith('<') or any(marker in lowered for marker in _HTML_MARKERS):
+        return HTML
+    return TEXT
+
+def _tiff_size(buffer) -> Optional[Tuple[int, int]]:
+    """ImageWidth and ImageLength from a TIFF's first IFD."""
+    order = '<' if buffer[:2] == b'II' else '>'
+    offset = struct.unpack_from(order + 'I', buffer, 4)[0]
+    entries = struct.unpack_from(order + 'H', buffer, offset)[0]
+    size = {}
+    for i in range(entries):
+        tag, kind, _ = struct.unpack_from(order + 'HHI', buffer, offset + 2 + 12 * i)
+        if tag in (256, 257):
+            # SHORT or LONG, stored left-justified in the value field
+            size[tag] = struct.unpack_from(order + ('H' if kind == 3 else 'I'), buffer, offset + 10 + 12 * i)[0]
+    if 256 in size and 257 in size:
+        return size[256], size[257]
+    return None
+
+def image_size(buffer) -> Optional[Tuple[int, int]]:
+    """(width, height) read from a PNG, GIF, JPEG, WebP, BMP or TIFF header, without decoding.
+
+    None for other formats, or when ``buffer`` is cut off before the
+    dimensions (a JPEG's frame header, a TIFF's first IFD).
+    """
+    try:
+        if buffer[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack_from('>II', buffer, 16)
+        if buffer[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack_from('<HH', buffer, 6)
+        if buffer[:2] == b'\xff\xd8':
+            # Walk the segments up to the frame header; EXIF and ICC blocks come first
+            i = 2
+            while True:
+                while buffer[i] != 0xFF:
+                    i += 1
+                while buffer[i] == 0xFF:
+                    i += 1
+                marker = buffer[i]
+                i += 1
+                if marker in _JPEG_STANDALONE:
+                    continue
+                if marker in _JPEG_SOF:
+                    height, width = struct.unpack_from('>HH', buffer, i + 3)
+                    return width, height
+                i += struct.unpack_from('>H', buffer, i)[0]
+        if buffer[:4] == b'RIFF' and buffer[8:12] == b'WEBP':
+            chunk = bytes(buffer[12:16])
+            if chunk == b'VP8 ':
+                width, height = struct.unpack_from('<HH', buffer, 26)
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L':
+                bits = struct.unpack_from('<I', buffer, 21)[0]
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                canvas = bytes(buffer[24:30])
+                return int.from_bytes(canvas[:3], 'little') + 1, int.from_bytes(canvas[3:], 'little') + 1
+            return None
+        if buffer[:2] == b'BM':
+            if struct.unpack_from('<I', buffer, 14)[0] == 12:
+                return struct.unpack_from('<HH', buffer, 18)
+            width, height = struct.unpack_from('<ii', buffer, 18)
+            # Negative heights are top-down bitmaps
+            return abs(width), abs(height)
+        if buffer[:4] in (b'II*\x00', b'MM\x00*'):
+            return _tiff_size(buffer)
+    except (IndexError, struct.error):
+        pass
+    return None
+
+def check_image_pixels(buffer, max_pixels: int = MAX_IMAGE_PIXELS) -> None:
+    """Refuse an image before anything decodes it.
+
+    Raises ImageTooLargeError if its header declares more than
+    ``max_pixels``, and UnreadableImageError if no size can be read from
+    it (a format we don't parse, or a truncated file), since its size
+    can't be checked. ``buffer`` must be the whole upload; PDFs, HTML and
+    text pass.
+    """
+    if document_kind(buffer) != IMAGE:
+        return
+    size = image_size(buffer)
+    if size is None:
+        raise UnreadableImageError(
+            "Could not read the image's dimensions; please upload a PNG, JPEG, GIF, WebP, BMP or TIFF image"
+        )
+    if size[0] * size[1] > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {size[0]}x{size[1]} pixels; the limit is {max_pixels / 1e6:.0f} megapixels"
+        )
+
+class _HTMLText(HTMLParser):
+    """Collects an HTML document's visible text, one line per block or table row."""
+    BLOCK_TAGS = {'p', 'div', 'br', 'tr', 'li', 'table', 'tbody', 'thead', 'tfoot', 'section',
+                  'article', 'header', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'dt', 'dd'}
+    CELL_TAGS = {'td', 'th'}
+    HIDDEN_TAGS = {'script', 'style', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._line: List[str] = []
+        self._hidden = 0
+
+    def _break(self):
+        line = ' '.join(' '.join(self._line).split())
+        if line:
+            self.lines.append(line)
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.HIDDEN_TAGS:
+            self._hidden += 1
+        elif tag in self.BLOCK_TAGS:
+            self._break()
+        elif tag in self.CELL_TAGS:
+            self._line.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.HIDDEN_TAGS:
+            self._hidden = max(0, self._hidden - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._break()
+
+    def handle_data(self, data):
+        if not self._hidden:
+            self._line.append(data)
+
+    def close(self):
+        super().close()
+        self._break()
+
+def html_lines(buffer) -> List[str]:
+    parser = _HTMLText()
+    parser.feed(bytes(buffer).decode('utf-8-sig', errors='replace'))
+    parser.close()
+    return parser.lines
+
+def text_lines(buffer) -> List[str]:
+    text = bytes(buffer).decode('utf-8-sig', errors='replace')
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def pdf_pages(buffer, dpi: int = PDF_RASTER_DPI) -> List[Union[List[str], np.ndarray]]:
+    """Each PDF page's text lines, or a grayscale rendering of pages without a text layer.
+
+    Needs PyMuPDF; it is imported here so image-only deployments don't load it.
+    """
+    try:
+        import fitz
+    except ImportError:
+        raise ValueError("PDF receipts need PyMuPDF (pip install PyMuPDF)")
+
+    pages: List[Union[List[str], np.ndarray]] = []
+    try:
+        document = fitz.open(stream=bytes(buffer), filetype='pdf')
+    except Exception as e:
+        raise ValueError(f"Could not read the uploaded PDF: {str(e)}")
+    with document:
+        for page in document:
+            # sort=True orders text blocks top-to-bottom, left-to-right, as printed
+            lines = [line.strip() for line in page.get_text('text', sort=True).splitlines() if line.strip()]
+            if lines:
+                pages.append(lines)
+                continue
+            logger.info(f"PDF page {page.number + 1} has no text layer; rasterizing at {dpi} dpi")
+            pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+            pages.append(
+                np.frombuffer(pixmap.samples, dtype=np.uint8)
+                .reshape(pixmap.height, pixmap.stride)[:, :pixmap.width].copy()
+            )
+    return pages
@@ -0,0 +1,190 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Receipt detection runs on a copy scaled to this long edge
+DETECT_LONG_EDGE = 1200
+
+@dataclass
+class GeometryPlan:
+    """How to map a photo onto a cropped, straightened, resampled receipt."""
+    transform: np.ndarray  # 3x3 homography from source to output pixels
+    width: int
+    height: int
+    cropped: bool
+    angle: float
+    scale: float
+    text_height: Optional[float] = None  # median character height in output pixels, if measured
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    """Order four corners as top-left, top-right, bottom-right, bottom-left."""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)]
+    ], dtype=np.float32)
+
+def find_receipt_quad(small: np.ndarray, min_area: float = 0.1, max_area: float = 0.95) -> Optional[np.ndarray]:
+    """Find the receipt's bounding quadrilateral in a downscaled grayscale photo.
+
+    The paper is taken to be the largest bright region. Returns corners in
+    ``small``'s pixels, or None when nothing receipt-sized stands out from
+    the background (e.g. screenshots and close-ups).
+    """
+    blurred = cv2.GaussianBlur(small, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+
+    contour = max(contours, key=cv2.contourArea)
+    area = cv2.contourArea(contour) / float(small.shape[0] * small.shape[1])
+    if not min_area <= area <= max_area:
+        return None
+
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    if len(approx) == 4:
+        return _order_corners(approx)
+    # Curled or torn paper: fall back to the tightest rotated rectangle
+    return _order_corners(cv2.boxPoints(cv2.minAreaRect(contour)))
+
+def text_mask(small: np.ndarray) -> np.ndarray:
+    """Binary mask of dark text strokes in a downscaled grayscale image."""
+    return cv2.adaptiveThreshold(
+        small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 21, 11
+    )
+
+def _profile_score(mask: np.ndarray, angle: float) -> float:
+    """How sharply text rows stand out after rotating the mask by ``angle``."""
+    height, width = mask.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotated = cv2.warpAffine(mask, rotation, (width, height), flags=cv2.INTER_NEAREST)
+    return float(np.var(rotated.sum(axis=1, dtype=np.float64)))
+
+def estimate_skew(mask: np.ndarray, max_angle: float = 15.0) -> float:
+    """Rotation in degrees (cv2 convention) that makes the text lines horizontal.
+
+    Projection-profile search: straight lines of text give row sums with
+    the most contrast between text rows and the gaps between them. A
+    coarse 1 degree sweep is refined in 0.2 degree steps.
+    """
+    scale = min(1.0, 600.0 / max(mask.shape))
+    if scale < 1.0:
+        mask = cv2.resize(mask, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if cv2.countNonZero(mask) < 50:
+        return 0.0
+
+    coarse = max(np.arange(-max_angle, max_angle + 1), key=lambda a: _profile_score(mask, a))
+    fine = max(np.arange(coarse - 1, coarse + 1.01, 0.2), key=lambda a: _profile_score(mask, a))
+    return float(round(fine, 1))
+
+def estimate_text_height(mask: np.ndarray) -> Optional[float]:
+    """Median character height in pixels, or None with too few characters to tell."""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Keep character-sized blobs: not specks, not rules or table edges
+    keep = (heights >= 3) & (heights <= mask.shape[0] / 8) & (widths <= heights * 4)
+    if np.count_nonzero(keep) < 20:
+        return None
+    return float(np.median(heights[keep]))
+
+def plan_geometry(gray: np.ndarray, crop: bool = True, deskew: bool = True,
+                  target_text_height: int = 0, max_upscale: float = 2.0,
+                  max_long_edge: int = 0, max_width: int = 0) -> GeometryPlan:
+    """Work out a single warp that crops, straightens and resamples the receipt.
+
+    Detection runs on a small copy; the returned plan is applied once to the
+    full-resolution image, so every pixel is resampled only one time.
+    ``max_width`` caps only the width, for tiled OCR of long receipts.
+    """
+    height, width = gray.shape[:2]
+    detect_scale = min(1.0, DETECT_LONG_EDGE / float(max(height, width)))
+    small = gray if detect_scale == 1.0 else cv2.resize(
+        gray, None, fx=detect_scale, fy=detect_scale, interpolation=cv2.INTER_AREA
+    )
+
+    quad = find_receipt_quad(small) if crop else None
+    if quad is not None:
+        src = quad / detect_scale
+        out_w = max(np.linalg.norm(src[1] - src[0]), np.linalg.norm(src[2] - src[3]))
+        out_h = max(np.linalg.norm(src[3] - src[0]), np.linalg.norm(src[2] - src[1]))
+        dst = np.array([[0, 0], [out_w, 0], [out_w, out_h], [0, out_h]], dtype=np.float32)
+        transform = cv2.getPerspectiveTransform(src.astype(np.float32), dst)
+        # Measure text on the rectified receipt so height and skew are meaningful
+        small_rect = cv2.warpPerspective(
+            gray, np.diag([detect_scale, detect_scale, 1.0]) @ transform,
+            (max(1, int(out_w * detect_scale)), max(1, int(out_h * detect_scale)))
+        )
+        mask = text_mask(small_rect)
+        angle = 0.0  # the perspective correction already straightened it
+    else:
+        out_w, out_h = float(width), float(height)
+        transform = np.eye(3)
+        mask = text_mask(small)
+        angle = estimate_skew(mask) if deskew else 0.0
+        if abs(angle) < 0.5:
+            angle = 0.0
+
+    scale = 1.0
+    text_height = estimate_text_height(mask) if target_text_height else None
+    if target_text_height:
+        if text_height:
+            scale = min(max_upscale, target_text_height / (text_height / detect_scale))
+    if max_long_edge:
+        scale = min(scale, max_long_edge / max(out_w, out_h))
+    if max_width:
+        scale = min(scale, max_width / out_w)
+
+    if angle:
+        # Rotate about the centre and grow the canvas to fit the rotated image
+        rotation = np.vstack([cv2.getRotationMatrix2D((out_w / 2, out_h / 2), angle, 1.0), [0, 0, 1]])
+        cos, sin = abs(rotation[0, 0]), abs(rotation[0, 1])
+        rot_w, rot_h = out_h * sin + out_w * cos, out_h * cos + out_w * sin
+        rotation[0, 2] += rot_w / 2 - out_w / 2
+        rotation[1, 2] += rot_h / 2 - out_h / 2
+        transform = rotation @ transform
+        out_w, out_h = rot_w, rot_h
+
+    transform = np.diag([scale, scale, 1.0]) @ transform
+    return GeometryPlan(
+        transform=transform,
+        width=max(1, int(round(out_w * scale))),
+        height=max(1, int(round(out_h * scale))),
+        cropped=quad is not None,
+        angle=angle,
+        scale=scale,
+        text_height=text_height / detect_scale * scale if text_height else None
+    )
+
+def apply_geometry(gray: np.ndarray, plan: GeometryPlan) -> np.ndarray:
+    """Warp the image according to the plan; identity plans return it untouched."""
+    if not plan.cropped and not plan.angle and plan.scale == 1.0:
+        return gray
+    if not plan.cropped and not plan.angle:
+        interpolation = cv2.INTER_AREA if plan.scale < 1.0 else cv2.INTER_CUBIC
+        return cv2.resize(gray, (plan.width, plan.height), interpolation=interpolation)
+
+    transform = plan.transform
+    if plan.scale < 1.0:
+        # warpPerspective has no area filter, so shrink first to avoid aliasing
+        # and warp the smaller image with the transform adjusted to match
+        gray = cv2.resize(gray, None, fx=plan.scale, fy=plan.scale, interpolation=cv2.INTER_AREA)
+        shrink = np.diag([plan.scale, plan.scale, 1.0])
+        transform = transform @ np.linalg.inv(shrink)
+    # Paper-white border so the thresholding doesn't see a dark frame
+    return cv2.warpPerspective(
+        gray, transform, (plan.width, plan.height),
+        flags=cv2.INTER_LINEAR if plan.scale < 1.0 else cv2.INTER_CUBIC,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=255
+    )
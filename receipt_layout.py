@@ -0,0 +1,164 @@
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# A word that is a whole amount, e.g. "8.79" or "$19.38"
+_AMOUNT_WORD = re.compile(r'\$?(\d+\.\d{2})$')
+
+@dataclass
+class OCRWord:
+    """One recognised word (or EasyOCR text box) with its pixel box."""
+    text: str
+    confidence: float  # 0..1
+    left: int
+    top: int
+    right: int
+    bottom: int
+    # The word's amount as a decimal string, or None if it isn't one
+    amount: Optional[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        match = _AMOUNT_WORD.match(self.text)
+        self.amount = match.group(1) if match else None
+
+    @property
+    def height(self) -> int:
+        return max(1, self.bottom - self.top)
+
+@dataclass
+class OCRLine:
+    """One line of text from an OCR engine with its position and words, left to right."""
+    text: str
+    confidence: float  # 0..1
+    top: int
+    bottom: int
+    left: int
+    engine: str
+    words: List[OCRWord] = field(default_factory=list)
+
+    @property
+    def height(self) -> int:
+        return max(1, self.bottom - self.top)
+
+    def shifted(self, dy: int) -> "OCRLine":
+        """This line moved ``dy`` pixels down, e.g. from a tile into page coordinates."""
+        return OCRLine(
+            self.text, self.confidence, self.top + dy, self.bottom + dy, self.left, self.engine,
+            [OCRWord(w.text, w.confidence, w.left, w.top + dy, w.right, w.bottom + dy) for w in self.words]
+        )
+
+@dataclass
+class Column:
+    """A vertical band of the receipt, in pixels."""
+    left: int
+    right: int
+
+    def contains(self, word: OCRWord, tolerance: int = 0) -> bool:
+        return self.left - tolerance <= word.left and word.right <= self.right + tolerance
+
+@dataclass
+class ReceiptLayout:
+    """OCR lines in reading order plus the receipt's right-aligned price column.
+
+    ``price_column`` is None when too few amounts line up to find one;
+    each line's rightmost amount is then taken as its price.
+    """
+    lines: List[OCRLine]
+    price_column: Optional[Column] = None
+    # How far a price may stick out of the column and still belong to it
+    tolerance: int = 0
+
+    def texts(self) -> List[str]:
+        return [line.text for line in self.lines]
+
+    def price_index(self, line: OCRLine) -> Optional[int]:
+        """Index of the line's price word, or None when it has no price."""
+        for i in range(len(line.words) - 1, -1, -1):
+            word = line.words[i]
+            if word.amount is None:
+                continue
+            if self.price_column is None or self.price_column.contains(word, self.tolerance):
+                return i
+        return None
+
+    def description_column(self) -> Optional[Column]:
+        """Everything left of the price column."""
+        if self.price_column is None or not self.lines:
+            return None
+        left = min(line.words[0].left for line in self.lines)
+        return Column(left, self.price_column.left - 1)
+
+def find_price_column(lines: List[OCRLine], min_amounts: int = 2) -> Optional[Column]:
+    """Locate the band the amounts are right-aligned in.
+
+    Prices line up on their right edge, so the column is centred on the
+    median right edge of each line's last amount; amounts further than a
+    couple of text heights away (unit prices, dates) are left out of it.
+    """
+    amounts = []
+    for line in lines:
+        last = next((word for word in reversed(line.words) if word.amount is not None), None)
+        if last is not None:
+            amounts.append(last)
+    if len(amounts) < min_amounts:
+        return None
+
+    edges = sorted(word.right for word in amounts)
+    median_edge = edges[len(edges) // 2]
+    heights = sorted(word.height for word in amounts)
+    slack = 2 * heights[len(heights) // 2]
+    members = [word for word in amounts if abs(word.right - median_edge) <= slack]
+    return Column(min(word.left for word in members), max(word.right for word in members))
+
+def _clean_words(words: List[OCRWord], clean: Callable[[str], str]) -> List[OCRWord]:
+    # Cleaning the whole line is one call instead of one per word; it only
+    # falls back to per-word cleaning when a word vanished or split
+    raw = [word.text for word in words]
+    tokens = clean(' '.join(raw)).split()
+    if len(tokens) != len(words):
+        tokens = [clean(text) for text in raw]
+    return [
+        word if text == word.text else OCRWord(text, word.confidence, word.left, word.top, word.right, word.bottom)
+        for word, text in zip(words, tokens) if text
+    ]
+
+def build_layout(lines: List[OCRLine], clean: Optional[Callable[[str], str]] = None) -> ReceiptLayout:
+    """Order OCR lines top to bottom, clean their words and find the price column."""
+    return layout_from_lines(order_lines(lines, clean))
+
+def order_lines(lines: List[OCRLine], clean: Optional[Callable[[str], str]] = None) -> List[OCRLine]:
+    """OCR lines sorted top to bottom with their words left to right.
+
+    ``clean`` normalises text (dropping words that come back empty); line
+    text is rebuilt from the cleaned words.
+    """
+    ordered: List[OCRLine] = []
+    for line in sorted(lines, key=lambda line: (line.top, line.left)):
+        words = sorted(line.words, key=lambda word: word.left)
+        if clean is not None:
+            words = _clean_words(words, clean)
+        if not words:
+            continue
+        ordered.append(OCRLine(
+            text=' '.join(word.text for word in words),
+            confidence=line.confidence,
+            top=line.top,
+            bottom=line.bottom,
+            left=words[0].left,
+            engine=line.engine,
+            words=words
+        ))
+    return ordered
+
+def layout_from_lines(ordered: List[OCRLine]) -> ReceiptLayout:
+    """Find the price column of lines already in reading order."""
+    column = find_price_column(ordered)
+    tolerance = 0
+    if column is not None:
+        heights = sorted(line.height for line in ordered)
+        tolerance = heights[len(heights) // 2]
+        logger.info(f"Price column at x={column.left}..{column.right}")
+    return ReceiptLayout(ordered, price_column=column, tolerance=tolerance)
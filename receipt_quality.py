@@ -0,0 +1,92 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Quality signals are measured on a copy scaled to this long edge
+MEASURE_LONG_EDGE = 1200
+
+# Laplacian variance below this is out of focus or motion-blurred, and
+# far above it is sensor noise or paper texture rather than text edges
+BLURRY_SHARPNESS = 60
+NOISY_SHARPNESS = 1500
+# Ink-to-paper range (1st to 99th percentile) of a faded thermal print
+FADED_CONTRAST = 100
+# Text shorter than this after resampling is too small to dilate
+SMALL_TEXT_HEIGHT = 18
+# Speckle measured as "text" this short means noise, not characters
+NOISE_TEXT_HEIGHT = 8
+
+@dataclass(frozen=True)
+class ThresholdVariant:
+    """Blur, threshold and dilation settings for one binarization."""
+    name: str
+    blur: int  # Gaussian kernel size, 0 for none
+    block: int  # adaptive threshold neighbourhood, odd; 0 for one global Otsu threshold
+    c: int  # subtracted from the neighbourhood mean
+    dilate: int  # square kernel size, 0 for none
+    median: int = 0  # median blur kernel size, used instead of the Gaussian; 0 for none
+
+VARIANTS = {
+    # The long-standing defaults; good on sharp, well-lit photos and screenshots
+    'standard': ThresholdVariant('standard', blur=3, block=21, c=11, dilate=2),
+    # Blurry or faded: no extra blur and a lower offset keep weak strokes
+    'soft': ThresholdVariant('soft', blur=0, block=31, c=7, dilate=0),
+    # Small text: a tighter window, and no dilation to close up letters
+    'fine': ThresholdVariant('fine', blur=3, block=15, c=9, dilate=0),
+    # Noisy: a median filter removes speckle that local thresholds would
+    # turn into ink, and a global threshold ignores what's left
+    'denoise': ThresholdVariant('denoise', blur=0, block=0, c=0, dilate=0, median=5)
+}
+
+@dataclass
+class ImageQuality:
+    """Cheap signals about a normalized grayscale receipt."""
+    contrast: float  # 1st-99th percentile range before autocontrast, 0..255
+    sharpness: float  # variance of the Laplacian
+    text_height: Optional[float]  # median character height in pixels
+
+    @property
+    def condition(self) -> str:
+        if self.sharpness < BLURRY_SHARPNESS:
+            return 'blurry'
+        if self.sharpness > NOISY_SHARPNESS or (self.text_height is not None and self.text_height < NOISE_TEXT_HEIGHT):
+            return 'noisy'
+        if self.contrast < FADED_CONTRAST:
+            return 'faded'
+        if self.text_height is not None and self.text_height < SMALL_TEXT_HEIGHT:
+            return 'small_text'
+        return 'clean'
+
+# Variants to try, best guess first, for each condition
+_RANKINGS = {
+    'clean': ('standard', 'fine', 'soft'),
+    'blurry': ('soft', 'standard', 'fine'),
+    'noisy': ('denoise', 'soft', 'standard'),
+    'faded': ('soft', 'standard', 'denoise'),
+    'small_text': ('fine', 'standard', 'soft')
+}
+
+def measure_quality(gray: np.ndarray, text_height: Optional[float] = None) -> ImageQuality:
+    """Contrast and sharpness of a receipt, measured on a small copy.
+
+    Call it before autocontrast, which would stretch every image's range
+    to the same 0..255. ``text_height`` is passed through from geometry
+    planning, which has already measured it.
+    """
+    scale = min(1.0, MEASURE_LONG_EDGE / float(max(gray.shape[:2])))
+    small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    cumulative = np.cumsum(cv2.calcHist([small], [0], None, [256], [0, 256]).ravel())
+    low, high = np.searchsorted(cumulative, (0.01 * small.size, 0.99 * small.size))
+    sharpness = float(cv2.Laplacian(small, cv2.CV_32F).var())
+    return ImageQuality(contrast=float(high - low), sharpness=sharpness, text_height=text_height)
+
+def rank_variants(quality: ImageQuality, limit: int = 3) -> List[ThresholdVariant]:
+    """The binarizations worth trying for an image of this quality, most promising first."""
+    names = _RANKINGS[quality.condition][:max(1, limit)]
+    return [VARIANTS[name] for name in names]
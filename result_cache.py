@@ -0,0 +1,125 @@
+import os
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def content_key(data: bytes, version: str) -> str:
+    """Cache key for an upload: hash of its bytes plus the parser config version."""
+    return f"{hashlib.sha256(data).hexdigest()}:{version}"
+
+class ResultCache:
+    """Parsed-receipt cache with an in-memory LRU tier and an optional sqlite tier.
+
+    The memory tier is per process. The sqlite tier is a file that every
+    gunicorn worker on the host can share, so a re-upload is a hit no
+    matter which worker receives it.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 3600, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if db_path:
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS results '
+                    '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+                )
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        'SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?',
+                        (key, now)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Result cache read failed: {str(e)}")
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                    self._store(key, value, row[1])
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Dict) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, copy.deepcopy(value), expires_at)
+
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(value), expires_at)
+                    )
+                    conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+            except sqlite3.Error as e:
+                logger.error(f"Result cache write failed: {str(e)}")
+
+    def _store(self, key: str, value: Dict, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+def create_result_cache() -> Optional[ResultCache]:
+    """Build the cache from RECEIPT_CACHE_* settings; None when disabled."""
+    max_entries = int(os.getenv('RECEIPT_CACHE_SIZE', 128))
+    if max_entries <= 0:
+        return None
+    return ResultCache(
+        max_entries=max_entries,
+        ttl=float(os.getenv('RECEIPT_CACHE_TTL', 3600)),
+        db_path=os.getenv('RECEIPT_CACHE_DB') or None
+    )
@@ -0,0 +1,340 @@
+import os
+import time
+import zlib
+import secrets
+import sqlite3
+import logging
+import tempfile
+import threading
+from decimal import Decimal
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import JSONTag, TaggedJSONSerializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Payloads at least this big are zlib-compressed before they are stored
+COMPRESS_MIN_BYTES = 1024
+
+SESSION_SECONDS = REGISTRY.histogram('session_io_seconds', 'Time to load or save a session, serialization included')
+SESSION_BYTES = REGISTRY.histogram(
+    'session_payload_bytes', 'Stored size of saved sessions',
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+)
+
+class TagDecimal(JSONTag):
+    """Round-trip Decimal amounts exactly instead of coercing them to float."""
+    __slots__ = ()
+    key = ' dec'
+
+    def check(self, value) -> bool:
+        return isinstance(value, Decimal)
+
+    def to_json(self, value):
+        return str(value)
+
+    def to_python(self, value):
+        return Decimal(value)
+
+class SessionSerializer:
+    """Flask's tagged JSON plus Decimal, zlib-compressed when it pays off."""
+
+    def __init__(self):
+        self._json = TaggedJSONSerializer()
+        self._json.register(TagDecimal)
+
+    def dumps(self, data: Dict) -> bytes:
+        payload = self._json.dumps(data).encode('utf-8')
+        if len(payload) >= COMPRESS_MIN_BYTES:
+            return b'z' + zlib.compress(payload)
+        return b'j' + payload
+
+    def loads(self, blob: bytes) -> Dict:
+        payload = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+        return self._json.loads(payload.decode('utf-8'))
+
+class SessionStore:
+    """Where serialized sessions live, keyed by session id."""
+
+    def load(self, sid: str) -> Optional[Tuple[bytes, float]]:
+        """Return ``(payload, expires_at)``, or None for unknown or expired ids."""
+        raise NotImplementedError
+
+    def save(self, sid: str, payload: bytes, expires_at: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, sid: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+class MemorySessionStore(SessionStore):
+    """Per-process store; only correct with a single gunicorn worker."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def load(self, sid: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._remove(sid)
+                return None
+            self._entries.move_to_end(sid)
+            return entry
+
+    def save(self, sid: str, payload: bytes, expires_at: float) -> None:
+        with self._lock:
+            self._remove(sid)
+            self._entries[sid] = (payload, expires_at)
+            self._bytes += len(payload)
+            now = time.time()
+            # Least recently used first: drop it when expired or over capacity
+            while self._entries:
+                oldest, (_, oldest_expiry) = next(iter(self._entries.items()))
+                if oldest_expiry > now and len(self._entries) <= self.max_entries:
+                    break
+                self._remove(oldest)
+                self._evictions += 1
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._remove(sid)
+
+    def _remove(self, sid: str) -> None:
+        entry = self._entries.pop(sid, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries),
+                    'bytes': self._bytes, 'evictions': self._evictions}
+
+class SqliteSessionStore(SessionStore):
+    """File-backed store that every gunicorn worker on the host shares."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions '
+                '(sid TEXT PRIMARY KEY, payload BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)')
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, sid: str) -> Optional[Tuple[bytes, float]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT payload, expires_at FROM sessions WHERE sid = ? AND expires_at > ?',
+                (sid, time.time())
+            ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def save(self, sid: str, payload: bytes, expires_at: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (sid, payload, expires_at) VALUES (?, ?, ?)',
+                (sid, payload, expires_at)
+            )
+            conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+
+    def delete(self, sid: str) -> None:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM sessions WHERE expires_at > ?',
+                (time.time(),)
+            ).fetchone()
+        return {'backend': 'sqlite', 'entries': entries, 'bytes': size}
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data held server-side; the cookie only carries ``sid``."""
+
+    def __init__(self, initial=None, sid: Optional[str] = None, expires_at: float = 0.0):
+        def on_update(session):
+            session.modified = True
+        initial = dict(initial or {})
+        self._permanent = bool(initial.pop('_permanent', False))
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+        self.expires_at = expires_at
+        self.modified = False
+        self.load_seconds = 0.0
+
+    # Kept off the dict so setting it on every request doesn't force a write
+    @property
+    def permanent(self) -> bool:
+        return self._permanent
+
+    @permanent.setter
+    def permanent(self, value: bool) -> None:
+        self._permanent = bool(value)
+
+class ServerSessionInterface(SessionInterface):
+    """Keeps Flask sessions in a SessionStore and tracks what (de)serializing them costs.
+
+    Sessions are written back only when modified, or when more than half
+    their TTL has passed, so read-only page loads don't touch the store.
+    Paths under ``stateless_prefixes`` get a null session and no store I/O.
+    """
+
+    def __init__(self, store: SessionStore, ttl: float = 86400, stateless_prefixes: Tuple[str, ...] = ()):
+        self.store = store
+        self.ttl = ttl
+        self.stateless_prefixes = tuple(stateless_prefixes)
+        self.serializer = SessionSerializer()
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'load_seconds': 0.0, 'saves': 0, 'save_seconds': 0.0,
+                       'max_save_seconds': 0.0, 'saved_bytes': 0, 'max_payload_bytes': 0, 'errors': 0}
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt='server-session')
+
+    def open_session(self, app, request) -> Optional[ServerSession]:
+        if self.stateless_prefixes and request.path.startswith(self.stateless_prefixes):
+            # A null session: never loaded or saved
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie or not app.secret_key:
+            return ServerSession()
+        try:
+            sid = self._signer(app).unsign(cookie).decode('ascii')
+        except BadSignature:
+            return ServerSession()
+
+        start = time.perf_counter()
+        try:
+            entry = self.store.load(sid)
+            data = self.serializer.loads(entry[0]) if entry else None
+        except Exception as e:
+            logger.error(f"Session load failed: {str(e)}")
+            self._count('errors', 1)
+            entry = data = None
+        elapsed = time.perf_counter() - start
+        SESSION_SECONDS.observe(elapsed, op='load')
+        with self._lock:
+            self._stats['loads'] += 1
+            self._stats['load_seconds'] += elapsed
+        session = ServerSession() if entry is None else ServerSession(data, sid=sid, expires_at=entry[1])
+        session.load_seconds = elapsed
+        return session
+
+    def save_session(self, app, session: ServerSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid is not None:
+                try:
+                    self.store.delete(session.sid)
+                except Exception as e:
+                    logger.error(f"Session delete failed: {str(e)}")
+                    self._count('errors', 1)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        if not session.modified and not session.new and session.expires_at - now > self.ttl / 2:
+            return
+
+        sid = session.sid or secrets.token_urlsafe(32)
+        start = time.perf_counter()
+        try:
+            data = dict(session)
+            if session.permanent:
+                data['_permanent'] = True
+            payload = self.serializer.dumps(data)
+            self.store.save(sid, payload, now + self.ttl)
+        except Exception as e:
+            logger.error(f"Session save failed: {str(e)}")
+            self._count('errors', 1)
+            return
+        elapsed = time.perf_counter() - start
+        SESSION_SECONDS.observe(elapsed, op='save')
+        SESSION_BYTES.observe(len(payload))
+        with self._lock:
+            stats = self._stats
+            stats['saves'] += 1
+            stats['save_seconds'] += elapsed
+            stats['max_save_seconds'] = max(stats['max_save_seconds'], elapsed)
+            stats['saved_bytes'] += len(payload)
+            stats['max_payload_bytes'] = max(stats['max_payload_bytes'], len(payload))
+
+        session.sid, session.expires_at = sid, now + self.ttl
+        response.set_cookie(
+            name,
+            self._signer(app).sign(sid).decode('ascii'),
+            max_age=int(self.ttl) if session.permanent else None,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def _count(self, key: str, amount) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['mean_load_ms'] = round(1000 * stats['load_seconds'] / stats['loads'], 3) if stats['loads'] else 0.0
+        stats['mean_save_ms'] = round(1000 * stats['save_seconds'] / stats['saves'], 3) if stats['saves'] else 0.0
+        stats['mean_payload_bytes'] = stats['saved_bytes'] // stats['saves'] if stats['saves'] else 0
+        try:
+            stats['store'] = self.store.stats()
+        except Exception as e:
+            stats['store'] = {'error': str(e)}
+        return stats
+
+def create_session_interface(stateless_prefixes: Tuple[str, ...] = ()) -> Optional[ServerSessionInterface]:
+    """Build the session store from SESSION_* settings; None keeps Flask's cookie sessions.
+
+    sqlite is the default because every worker on the host sees it; the
+    memory store is only correct with a single worker process.
+    """
+    backend = os.getenv('SESSION_BACKEND', 'sqlite').lower()
+    if backend == 'cookie':
+        return None
+    if backend == 'memory':
+        store = MemorySessionStore(max_entries=int(os.getenv('SESSION_MAX_ENTRIES', 10000)))
+    elif backend == 'sqlite':
+        default_db = os.path.join(tempfile.gettempdir(), 'checksplitter-sessions.db')
+        store = SqliteSessionStore(os.getenv('SESSION_DB', default_db))
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return ServerSessionInterface(
+        store, ttl=float(os.getenv('SESSION_TTL', 86400)), stateless_prefixes=stateless_prefixes
+    )
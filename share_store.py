@@ -0,0 +1,203 @@
+import os
+import gzip
+import json
+import time
+import base64
+import hashlib
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Part of every ETag; bump it when the shared page's template changes so
+# stored pages are re-rendered and browsers drop their cached copies
+RENDER_VERSION = '1'
+
+def snapshot_id(snapshot: Dict) -> Tuple[str, bytes]:
+    """Content address of a snapshot (16 URL-safe characters, 96 bits) and its canonical JSON."""
+    payload = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    digest = hashlib.sha256(payload).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode('ascii'), payload
+
+@dataclass(frozen=True)
+class SharedPage:
+    """A shared split's rendered page, ready to send."""
+    share_id: str
+    etag: str
+    gzipped: bytes
+
+class ShareStore:
+    """Where snapshots and their rendered pages live, keyed by content address.
+
+    Snapshots are immutable: saving an id that exists keeps its snapshot
+    and only replaces a page rendered by another RENDER_VERSION.
+    """
+
+    def load(self, share_id: str) -> Optional[Tuple[bytes, bytes, str]]:
+        """Return ``(snapshot JSON, gzipped page, render version)``, or None for unknown ids."""
+        raise NotImplementedError
+
+    def save(self, share_id: str, snapshot: bytes, page: bytes, render_version: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+class MemoryShareStore(ShareStore):
+    """Per-process store; links only work on the worker that made them, until it restarts."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[bytes, bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, share_id: str) -> Optional[Tuple[bytes, bytes, str]]:
+        with self._lock:
+            return self._entries.get(share_id)
+
+    def save(self, share_id: str, snapshot: bytes, page: bytes, render_version: str) -> None:
+        with self._lock:
+            entry = self._entries.get(share_id)
+            self._entries[share_id] = (entry[0] if entry else snapshot, page, render_version)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries),
+                    'bytes': sum(len(snapshot) + len(page) for snapshot, page, _ in self._entries.values())}
+
+class SqliteShareStore(ShareStore):
+    """File-backed store that every gunicorn worker on the host shares."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS shares (share_id TEXT PRIMARY KEY, snapshot BLOB NOT NULL, '
+                'page BLOB NOT NULL, render_version TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self, share_id: str) -> Optional[Tuple[bytes, bytes, str]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT snapshot, page, render_version FROM shares WHERE share_id = ?', (share_id,)
+            ).fetchone()
+        return (bytes(row[0]), bytes(row[1]), row[2]) if row else None
+
+    def save(self, share_id: str, snapshot: bytes, page: bytes, render_version: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO shares (share_id, snapshot, page, render_version, created_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (share_id) DO UPDATE SET page = excluded.page, render_version = excluded.render_version '
+                'WHERE render_version != excluded.render_version',
+                (share_id, snapshot, page, render_version, time.time())
+            )
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(snapshot) + LENGTH(page)), 0) FROM shares'
+            ).fetchone()
+        return {'backend': 'sqlite', 'entries': entries, 'bytes': size}
+
+class SharedSplits:
+    """Publishes split snapshots and serves their pages from an in-process LRU.
+
+    A page is rendered and gzipped once, when its snapshot is published
+    (or after RENDER_VERSION changes); views are a cache lookup, or one
+    store read on a cold worker. ``render`` turns a snapshot into HTML.
+    """
+
+    def __init__(self, store: ShareStore, render: Callable[[Dict], str], cache_size: int = 256):
+        self.store = store
+        self.render = render
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, SharedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'renders': 0, 'hits': 0, 'misses': 0, 'not_found': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _remember(self, page: SharedPage) -> SharedPage:
+        if self.cache_size <= 0:
+            return page
+        with self._lock:
+            self._cache[page.share_id] = page
+            self._cache.move_to_end(page.share_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return page
+
+    def _render(self, share_id: str, snapshot: Dict) -> bytes:
+        start = time.perf_counter()
+        # mtime=0 keeps the bytes identical for identical pages
+        page = gzip.compress(self.render(snapshot).encode('utf-8'), compresslevel=9, mtime=0)
+        self._count('renders')
+        logger.info(f"Rendered shared split {share_id} in {(time.perf_counter() - start) * 1000:.1f} ms, "
+                    f"{len(page)} bytes gzipped")
+        return page
+
+    def publish(self, snapshot: Dict) -> str:
+        """Store a snapshot and its rendered page; returns its id, the same for the same split."""
+        share_id, payload = snapshot_id(snapshot)
+        with self._lock:
+            cached = share_id in self._cache
+        if not cached:
+            page = self._render(share_id, snapshot)
+            self.store.save(share_id, payload, page, RENDER_VERSION)
+            self._remember(SharedPage(share_id, f'{share_id}.{RENDER_VERSION}', page))
+        self._count('published')
+        return share_id
+
+    def page(self, share_id: str) -> Optional[SharedPage]:
+        with self._lock:
+            page = self._cache.get(share_id)
+            if page is not None:
+                self._cache.move_to_end(share_id)
+                self._stats['hits'] += 1
+                return page
+            self._stats['misses'] += 1
+
+        entry = self.store.load(share_id)
+        if entry is None:
+            self._count('not_found')
+            return None
+        payload, gzipped, render_version = entry
+        if render_version != RENDER_VERSION:
+            gzipped = self._render(share_id, json.loads(payload))
+            self.store.save(share_id, payload, gzipped, RENDER_VERSION)
+        return self._remember(SharedPage(share_id, f'{share_id}.{RENDER_VERSION}', gzipped))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats, cached=len(self._cache))
+        return stats
+
+def create_shared_splits(render: Callable[[Dict], str]) -> SharedSplits:
+    """Build the share store from SHARE_* settings."""
+    backend = os.getenv('SHARE_BACKEND', 'sqlite').lower()
+    if backend == 'memory':
+        store = MemoryShareStore()
+    elif backend == 'sqlite':
+        default_db = os.path.join(tempfile.gettempdir(), 'checksplitter-shares.db')
+        store = SqliteShareStore(os.getenv('SHARE_DB', default_db))
+    else:
+        raise ValueError(f"Unknown SHARE_BACKEND: {backend}")
+    return SharedSplits(store, render, cache_size=int(os.getenv('SHARE_CACHE_SIZE', 256)))
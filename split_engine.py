@@ -0,0 +1,315 @@
+"""Splits a receipt between people in exact integer cents.
+
+Tax and tip are first spread over the items in proportion to their
+prices, then every item's base/tax/tip cents are shared equally among
+the people it is assigned to. Both steps use the largest-remainder
+method, so no cent is created or lost: each component's shares sum to
+that component exactly, and the people's totals sum to items + tax + tip.
+
+LiveSplit keeps a split up to date while items are assigned one at a
+time, for the assign page.
+"""
+import math
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+Amount = Union[Decimal, float, int, str]
+
+def to_cents(value: Amount) -> int:
+    """Whole cents in an amount, rounding half up like round_decimal."""
+    return int((Decimal(str(value)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+class TotalsMismatchError(ValueError):
+    """The receipt's subtotal or total disagrees with its items, tax and tip."""
+
+def check_totals(prices: Sequence[Amount], subtotal: Amount, tax: Amount, tip: Amount, total: Amount) -> None:
+    """Raise TotalsMismatchError unless items add up to the subtotal and subtotal + tax + tip to the total.
+
+    Amounts are compared in whole cents after rounding half up.
+    """
+    items_subtotal = sum((Decimal(str(price)) for price in prices), Decimal('0'))
+    if to_cents(items_subtotal) != to_cents(subtotal):
+        raise TotalsMismatchError("Subtotal doesn't match item prices")
+    if to_cents(subtotal) + to_cents(tax) + to_cents(tip) != to_cents(total):
+        raise TotalsMismatchError("Total doesn't match subtotal + tax + tip")
+
+def largest_remainder(amount: int, weights: np.ndarray) -> np.ndarray:
+    """Split ``amount`` cents in proportion to integer ``weights``.
+
+    Everyone gets the floor of their exact share; the cents left over go
+    to the largest remainders, ties to the lowest index.
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    total_weight = int(weights.sum())
+    if total_weight == 0:
+        weights = np.ones_like(weights)
+        total_weight = len(weights)
+    # Python ints: amount * weight can overflow int64 for big bills
+    exact = weights.astype(object) * amount
+    shares = (exact // total_weight).astype(np.int64)
+    remainders = (exact % total_weight).astype(np.int64)
+    leftover = amount - int(shares.sum())
+    if leftover:
+        order = np.lexsort((np.arange(len(weights)), -remainders))
+        shares[order[:leftover]] += 1
+    return shares
+
+def _apportion(owed: Sequence[int], denominator: int, leftover: int) -> np.ndarray:
+    """Hamilton apportionment of ``leftover`` cents over amounts owed in 1/``denominator`` cents.
+
+    Everyone gets the whole cents in what they're owed, and the cents left
+    go to the largest fractions, ties to the lowest index. The arithmetic
+    is exact, so the result doesn't depend on how ``owed`` was summed.
+    """
+    owed = [int(amount) for amount in owed]
+    shares = np.array([amount // denominator for amount in owed], dtype=np.int64)
+    extra = leftover - int(shares.sum())
+    if extra > 0:
+        order = sorted(range(len(owed)), key=lambda p: (-(owed[p] % denominator), p))
+        shares[order[:extra]] += 1
+    return shares
+
+def _share_among_assignees(item_cents: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Per-person cents when each item's cents are split evenly among its assignees.
+
+    ``item_cents`` is items x components (base, tax, tip). Whole cents of
+    every share come from one matrix product; the cents left over are
+    handed out by largest remaining fraction of a cent, so nobody ends up
+    more than a cent from exact in any component.
+    """
+    counts = matrix.sum(axis=1)
+    whole = item_cents // counts[:, None]
+    shares = matrix.T.astype(np.int64) @ whole
+    # Fractions of a cent as exact multiples of 1/denominator cent
+    denominator = math.lcm(*np.unique(counts).tolist())
+    if denominator * len(counts) < 2**62:
+        scale = (denominator // counts)[:, None]
+        owed = matrix.T.astype(np.int64) @ ((item_cents % counts[:, None]) * scale)
+    else:
+        # Python ints where the sums could overflow int64
+        scale = np.array([[denominator // int(count)] for count in counts], dtype=object)
+        owed = matrix.T.astype(object) @ ((item_cents % counts[:, None]).astype(object) * scale)
+    leftover = item_cents.sum(axis=0) - shares.sum(axis=0)
+    for component in range(item_cents.shape[1]):
+        shares[:, component] += _apportion(owed[:, component], denominator, int(leftover[component]))
+    return shares
+
+@dataclass
+class Split:
+    """Per-person cents, in the order of ``people``."""
+    people: List[str]
+    base_cents: np.ndarray
+    tax_cents: np.ndarray
+    tip_cents: np.ndarray
+
+    @property
+    def total_cents(self) -> np.ndarray:
+        return self.base_cents + self.tax_cents + self.tip_cents
+
+    def totals(self) -> Dict[str, Decimal]:
+        return {person: from_cents(cents) for person, cents in zip(self.people, self.total_cents)}
+
+    def breakdown(self) -> Dict[str, Dict[str, Decimal]]:
+        return {
+            person: {
+                'base': from_cents(base),
+                'tax': from_cents(tax),
+                'tip': from_cents(tip),
+                'total': from_cents(base + tax + tip)
+            }
+            for person, base, tax, tip in zip(
+                self.people, self.base_cents, self.tax_cents, self.tip_cents
+            )
+        }
+
+def assignment_matrix(people: Sequence[str], assignees: Sequence[Sequence[str]]) -> np.ndarray:
+    """Boolean items x people matrix; raises ValueError for unassigned items or unknown people."""
+    column = {person: j for j, person in enumerate(people)}
+    matrix = np.zeros((len(assignees), len(people)), dtype=bool)
+    for i, names in enumerate(assignees):
+        if not names:
+            raise ValueError(f"Item {i + 1} is not assigned to anyone")
+        for name in names:
+            if name not in column:
+                raise ValueError(f"Unknown person: {name}")
+            matrix[i, column[name]] = True
+    return matrix
+
+def item_components(prices: Sequence[Amount], tax: Amount = 0, tip: Amount = 0) -> np.ndarray:
+    """Items x (base, tax, tip) cents, with tax and tip spread over items by price."""
+    item_cents = np.array([to_cents(price) for price in prices], dtype=np.int64)
+    item_tax = largest_remainder(to_cents(tax), item_cents)
+    item_tip = largest_remainder(to_cents(tip), item_cents)
+    return np.stack([item_cents, item_tax, item_tip], axis=1)
+
+def split_receipt(prices: Sequence[Amount], assignees: Sequence[Sequence[str]], people: Sequence[str],
+                  tax: Amount = 0, tip: Amount = 0) -> Split:
+    """Split a receipt's items, tax and tip between ``people``.
+
+    ``assignees[i]`` lists who shares item ``i``; shares of an item are equal.
+    """
+    if not prices:
+        raise ValueError("No items to split")
+    if len(prices) != len(assignees):
+        raise ValueError("Every item needs a list of assignees")
+
+    matrix = assignment_matrix(people, assignees)
+    shares = _share_among_assignees(item_components(prices, tax, tip), matrix)
+    return Split(
+        people=list(people),
+        base_cents=shares[:, 0],
+        tax_cents=shares[:, 1],
+        tip_cents=shares[:, 2]
+    )
+
+class LiveSplit:
+    """A split updated one item at a time, as people are assigned on the assign page.
+
+    Every person's whole cents and exact fractions of a cent owed are kept
+    as running sums of the items' share vectors, so reassigning an item
+    only touches the people on it before and after; only the leftover-cent
+    apportionment, O(people log people), is redone. Items may be left
+    unassigned. Once every item is assigned, ``split()`` equals
+    ``split_receipt`` on the same assignments. State is plain ints and
+    lists so ``to_dict()`` can be kept in the session.
+    """
+
+    def __init__(self, people: Sequence[str], items: Sequence[Sequence[int]]):
+        self.people = list(people)
+        self.items = [list(map(int, components)) for components in items]  # base, tax, tip cents
+        self.assignees: List[List[int]] = [[] for _ in self.items]  # person indices
+        # Divisible by any number of assignees, so every fraction of a cent is a whole multiple of 1/denominator
+        self.denominator = math.lcm(*range(1, len(self.people) + 1))
+        self.whole = [[0, 0, 0] for _ in self.people]
+        self.owed = [[0, 0, 0] for _ in self.people]
+        self.assigned = [0, 0, 0]
+        self.total = sum(map(sum, self.items))
+        self.unassigned_items = len(self.items)
+        self._column = {person: j for j, person in enumerate(self.people)}
+        self._shares: Optional[List[List[int]]] = None
+
+    @classmethod
+    def create(cls, prices: Sequence[Amount], people: Sequence[str], tax: Amount = 0, tip: Amount = 0,
+               assignees: Optional[Sequence[Sequence[str]]] = None) -> "LiveSplit":
+        if not people:
+            raise ValueError("No people to split between")
+        live = cls(people, item_components(prices, tax, tip).tolist() if prices else [])
+        for index, names in enumerate(assignees or []):
+            if names:
+                live.assign(index, names)
+        return live
+
+    def _apply(self, index: int, sign: int) -> None:
+        assignees = self.assignees[index]
+        if not assignees:
+            return
+        count = len(assignees)
+        scale = self.denominator // count
+        for component, cents in enumerate(self.items[index]):
+            whole, fraction = divmod(cents, count)
+            for person in assignees:
+                self.whole[person][component] += sign * whole
+                self.owed[person][component] += sign * fraction * scale
+            self.assigned[component] += sign * cents
+        self.unassigned_items -= sign
+
+    def assign(self, index: int, names: Sequence[str]) -> List[str]:
+        """Share item ``index`` between ``names`` (none leaves it unassigned).
+
+        Returns the people whose share changed, in the order of ``people``.
+        """
+        if not 0 <= index < len(self.items):
+            raise ValueError(f"Unknown item: {index + 1}")
+        unknown = [name for name in names if name not in self._column]
+        if unknown:
+            raise ValueError(f"Unknown person: {unknown[0]}")
+        assignees = sorted({self._column[name] for name in names})
+        if assignees == self.assignees[index]:
+            return []
+
+        before = self.shares
+        self._apply(index, -1)
+        self.assignees[index] = assignees
+        self._apply(index, 1)
+        self._shares = None
+        after = self.shares
+        return [person for person, old, new in zip(self.people, before, after) if old != new]
+
+    @property
+    def shares(self) -> List[List[int]]:
+        """Per-person [base, tax, tip] cents of the assigned items."""
+        if self._shares is None:
+            columns = []
+            for component in range(3):
+                whole = [row[component] for row in self.whole]
+                leftover = self.assigned[component] - sum(whole)
+                extra = _apportion([row[component] for row in self.owed], self.denominator, leftover)
+                columns.append([cents + int(bonus) for cents, bonus in zip(whole, extra)])
+            self._shares = [list(row) for row in zip(*columns)]
+        return self._shares
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.items) and self.unassigned_items == 0
+
+    @property
+    def unassigned_cents(self) -> int:
+        return self.total - sum(self.assigned)
+
+    def item_assignees(self, index: int) -> List[str]:
+        """Names sharing item ``index``, in the order of ``people``."""
+        return [self.people[person] for person in self.assignees[index]]
+
+    def assignments(self) -> List[List[str]]:
+        return [self.item_assignees(index) for index in range(len(self.items))]
+
+    def split(self) -> Split:
+        shares = np.array(self.shares, dtype=np.int64).reshape(len(self.people), 3)
+        return Split(people=list(self.people), base_cents=shares[:, 0], tax_cents=shares[:, 1],
+                     tip_cents=shares[:, 2])
+
+    def breakdown(self, people: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, Decimal]]:
+        """Base, tax, tip and total of ``people`` (everyone by default)."""
+        shares = self.shares
+        return {
+            person: {
+                'base': from_cents(base),
+                'tax': from_cents(tax),
+                'tip': from_cents(tip),
+                'total': from_cents(base + tax + tip)
+            }
+            for person, (base, tax, tip) in (
+                (person, shares[self._column[person]]) for person in (self.people if people is None else people)
+            )
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'people': self.people,
+            'items': self.items,
+            'assignees': self.assignees,
+            'whole': self.whole,
+            'owed': self.owed,
+            'assigned': self.assigned,
+            'total': self.total,
+            'unassigned_items': self.unassigned_items,
+            'shares': self.shares
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LiveSplit":
+        live = cls(data['people'], data['items'])
+        live.assignees = data['assignees']
+        live.whole = data['whole']
+        live.owed = data['owed']
+        live.assigned = data['assigned']
+        live.total = data['total']
+        live.unassigned_items = data['unassigned_items']
+        live._shares = data['shares']
+        return live
@@ -0,0 +1,169 @@
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+# Set Tesseract path for Windows
+pytesseract.pytesseract.tesseract_cmd = os.getenv('TESSERACT_CMD', '/app/.apt/usr/bin/tesseract')
+
+# Uniform block of text, default (LSTM) engine
+PAGE_SEGMENTATION_MODE = 6
+ENGINE_MODE = 3
+LANGUAGE = 'eng'
+
+# Columns of Tesseract's TSV output, as pytesseract.image_to_data returns them
+_TSV_FIELDS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text')
+
+def parse_tsv(tsv: str) -> Dict[str, List]:
+    """Tesseract TSV as a dict of columns, typed like pytesseract's Output.DICT."""
+    data: Dict[str, List] = {name: [] for name in _TSV_FIELDS}
+    for row in tsv.splitlines():
+        values = row.split('\t', len(_TSV_FIELDS) - 1)
+        if len(values) < len(_TSV_FIELDS) - 1 or not values[0].isdigit():
+            continue  # header or blank line
+        values += [''] * (len(_TSV_FIELDS) - len(values))
+        for name, value in zip(_TSV_FIELDS[:-2], values):
+            data[name].append(int(value))
+        data['conf'].append(float(values[-2]))
+        data['text'].append(values[-1])
+    return data
+
+class TesseractEngine:
+    """Runs Tesseract on a grayscale image and returns its word boxes.
+
+    ``image_to_data`` returns a dict of columns shaped like pytesseract's
+    ``image_to_data(..., output_type=Output.DICT)``, whichever backend runs it.
+    """
+    name = ''
+
+    def __init__(self):
+        self._stats = {'calls': 0, 'seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def image_to_data(self, image: np.ndarray) -> Dict[str, List]:
+        start = time.perf_counter()
+        data = self._image_to_data(image)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self._stats['calls'] += 1
+            self._stats['seconds'] += elapsed
+        return data
+
+    def _image_to_data(self, image: np.ndarray) -> Dict[str, List]:
+        raise NotImplementedError
+
+    def warm_up(self) -> None:
+        """Load the model ahead of the first receipt, where the backend keeps one."""
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['mean_ms'] = round(1000 * stats['seconds'] / stats['calls'], 2) if stats['calls'] else 0.0
+        return stats
+
+class SubprocessTesseract(TesseractEngine):
+    """pytesseract: writes the image to a temp file and runs the tesseract binary on it.
+
+    Every call pays a process start and a fresh load of the language model.
+    """
+    name = 'subprocess'
+
+    def _image_to_data(self, image: np.ndarray) -> Dict[str, List]:
+        return pytesseract.image_to_data(
+            image,
+            config=f'--psm {PAGE_SEGMENTATION_MODE} --oem {ENGINE_MODE}',
+            lang=LANGUAGE,
+            output_type=pytesseract.Output.DICT
+        )
+
+class ResidentTesseract(TesseractEngine):
+    """Tesseract's C API through tesserocr, with the model loaded once per API instance.
+
+    A TessBaseAPI recognises one image at a time, so up to ``size``
+    instances are created on demand and shared through a queue; tesserocr
+    releases the GIL while recognising, so they run in parallel. Images are
+    handed over as raw 8-bit pixel buffers, without temp files.
+    """
+    name = 'resident'
+
+    def __init__(self, size: int, tessdata: Optional[str] = None):
+        super().__init__()
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.size = max(1, size)
+        self.tessdata = tessdata
+        self._idle: "queue.Queue" = queue.Queue()
+        self._created = 0
+        self._create_lock = threading.Lock()
+        self._stats.update({'instances': 0, 'load_seconds': 0.0})
+
+    def _create(self):
+        options = {'lang': LANGUAGE, 'psm': PAGE_SEGMENTATION_MODE, 'oem': ENGINE_MODE}
+        if self.tessdata:
+            options['path'] = self.tessdata
+        start = time.perf_counter()
+        api = self._tesserocr.PyTessBaseAPI(**options)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self._stats['instances'] += 1
+            self._stats['load_seconds'] += elapsed
+        logger.info(f"Loaded Tesseract API instance in {elapsed:.2f}s")
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._create()
+            except Exception:
+                with self._create_lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def warm_up(self) -> None:
+        self._idle.put(self._acquire())
+
+    def _image_to_data(self, image: np.ndarray) -> Dict[str, List]:
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        api = self._acquire()
+        try:
+            api.SetImageBytes(image.tobytes(), width, height, 1, width)
+            return parse_tsv(api.GetTSVText(0))
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+def create_tesseract_engine() -> TesseractEngine:
+    """Build the Tesseract backend chosen by TESSERACT_BACKEND (subprocess or resident)."""
+    backend = os.getenv('TESSERACT_BACKEND', 'subprocess').lower()
+    if backend == 'subprocess':
+        return SubprocessTesseract()
+    if backend != 'resident':
+        raise ValueError(f"Unknown TESSERACT_BACKEND: {backend}")
+    try:
+        return ResidentTesseract(
+            size=int(os.getenv('TESSERACT_POOL_SIZE', os.cpu_count() or 2)),
+            tessdata=os.getenv('TESSDATA_PREFIX') or None
+        )
+    except ImportError as e:
+        # Asked for explicitly, so don't quietly run the slower binary instead
+        raise RuntimeError(
+            f"TESSERACT_BACKEND=resident needs tesserocr (pip install tesserocr): {str(e)}"
+        ) from e